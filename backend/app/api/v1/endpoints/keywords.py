@@ -1,10 +1,27 @@
-from fastapi import APIRouter, HTTPException
-from app.models.requests import KeywordResearchRequest
-from app.models.responses import KeywordResponse
-from app.models.ad_groups import FinalKeywordResponse
+from fastapi import APIRouter, HTTPException, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from typing import Optional, Callable, Awaitable, Iterable, List, Literal, Tuple, TypeVar
+from app.models.requests import KeywordResearchRequest, OverlapRequest
+from app.models.responses import KeywordResponse, OverlapResponse
+from app.models.ad_groups import FinalKeywordResponse, SimplifiedDeliverable
+from app.models.keyword import KeywordData
 from app.services.base_keyword_service import BaseKeywordService
-from app.services.llm_service import LLMService
+from app.services.singletons import get_base_keyword_service, get_llm_service
+from app.services.llm_service import LOCAL_GROUPING
+from app.startup import startup_state
+from app.services.result_store import ResultStore
+from app.services.snapshot_store import SnapshotStore
+from app.services.deadline import Deadline
+from app.services.admission import AdmissionController, AdmissionRejected
+from app.services.cache_warmer import CacheWarmer
+from app.services.keyword_index import get_keyword_index
+from app.services.task_scheduler import get_task_scheduler
+from app.services.ads_editor_export import (
+    stream_rows, export_rows, export_filename, default_campaign_name, MEDIA_TYPES
+)
+from app.config import SNAPSHOT_MAX_AGE, DATAFORSEO_MODE, RELATED_MAX_LIMIT
 from .utils import read_config_yaml
+import asyncio
 import time
 import logging
 
@@ -13,13 +30,318 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
+result_store = ResultStore()
+snapshot_store = SnapshotStore()
+admission = AdmissionController()
+# Warm runs reuse the incremental refresh, so only stale sources and new keywords cost upstream/LLM calls
+cache_warmer = CacheWarmer(admission, result_store,
+                           refresh=lambda request, max_snapshot_age: run_refresh(request, Response(), max_snapshot_age))
+
+T = TypeVar("T")
+ExportFormat = Literal["csv", "tsv"]
+ExportScope = Literal["ad_groups", "keywords"]
+MatchType = Literal["exact", "phrase", "broad"]
+
+# Runs one pipeline stage, inside an admission slot when the pipeline is staged (see run_staged)
+Admit = Callable[[Callable[[], Awaitable[T]]], Awaitable[T]]
 
 
 @router.post("/search", response_model=FinalKeywordResponse)
-async def research_keywords(request: KeywordResearchRequest):
+async def research_keywords(request: KeywordResearchRequest, response: Response, max_age: Optional[int] = None,
+                            if_none_match: Optional[str] = Header(None),
+                            x_request_deadline: Optional[float] = Header(None),
+                            x_priority: Optional[str] = Header(None)):
+    """Main endpoint for keywords search
+
+    max_age (seconds): return the stored result for the same request if it is younger than this
+    deadline_seconds / X-Request-Deadline: latency bound, stages that don't fit are cut (see degradations)
+    X-Priority: admission lane, "interactive" (default) or "batch"
+    """
+    deadline = Deadline.from_request(request.deadline_seconds, x_request_deadline)
+    research_id = ResultStore.research_id(request)
+
+    stored = result_store.get(research_id, max_age=max_age) if max_age is not None else None
+    cache_warmer.record(research_id, request, max_age, hit=None if max_age is None else stored is not None)
+
+    if stored:
+        result, etag = stored
+        logger.info(f"Returning stored research {research_id} (max_age={max_age}s)")
+        if _etag_matches(etag, if_none_match):
+            return Response(status_code=304, headers={"ETag": etag})
+        response.headers["ETag"] = etag
+        return result
+
+    result, _, etag = await research_and_store(request, deadline, x_priority or "interactive")
+    if etag:
+        response.headers["ETag"] = etag
+    return result
+
+
+async def research_and_store(request: KeywordResearchRequest, deadline: Optional[Deadline],
+                             lane: str) -> Tuple[FinalKeywordResponse, List[KeywordData], Optional[str]]:
+    """Runs the pipeline in an admission slot and stores the result, returns (result, keywords, etag or None)"""
+    research_id = ResultStore.research_id(request)
+    result, keywords = await run_staged(lane, request.api_mode, lambda admit: run_research(request, deadline, admit), deadline)
+    result.research_id = research_id
+
+    # Don't store LLM fallbacks or deadline-cut results, the next request should retry instead of reusing them
+    if result.deliverable and fell_back(result.deliverable):
+        logger.warning(f"Not storing research {research_id}, ad group creation fell back")
+        return result, keywords, None
+    if result.degradations:
+        logger.warning(f"Not storing research {research_id}, degraded by deadline: {result.degradations}")
+        return result, keywords, None
+
+    # Full keyword list is kept next to the ad groups for exports and as the baseline for /refresh,
+    # serializing it is blocking file + JSON work
+    if result.deliverable:
+        await asyncio.to_thread(snapshot_store.put_grouping, research_id, keywords, result.deliverable)
+    return result, keywords, result_store.put(research_id, request, result)
 
 
-    """Main endpoint for keywords search"""
+def fell_back(deliverable: SimplifiedDeliverable) -> bool:
+    """Local grouping after every model on the ladder failed (error groups in results stored before the ladder)"""
+    return (deliverable.generated_by == LOCAL_GROUPING
+            or any(group.group_type == "error" for group in deliverable.ad_groups))
+
+
+@router.post("/refresh", response_model=FinalKeywordResponse)
+async def refresh_keywords(request: KeywordResearchRequest, response: Response, max_snapshot_age: int = SNAPSHOT_MAX_AGE,
+                           x_priority: Optional[str] = Header(None)):
+    """Incremental re-research: re-fetches stale sources only and updates the previous ad groups with the diff
+
+    The first refresh of a research runs the full pipeline and seeds the snapshots.
+    Runs in the batch admission lane unless X-Priority says otherwise
+    """
+    return await run_staged(x_priority or "batch", request.api_mode,
+                            lambda admit: run_refresh(request, response, max_snapshot_age, admit))
+
+
+async def run_refresh(request: KeywordResearchRequest, response: Response, max_snapshot_age: int,
+                      admit: Admit = None) -> FinalKeywordResponse:
+    admit = admit or run_now
+    start_time = time.time()
+    research_id = ResultStore.research_id(request)
+
+    try:
+        base_service = get_base_keyword_service()
+        keywords = await base_service.refresh_keywords(request, snapshot_store, max_snapshot_age)
+        processing_time = time.time() - start_time
+
+        llm_service = get_llm_service()
+        previous = await asyncio.to_thread(snapshot_store.get_grouping, research_id)
+        keyword_diff = None
+        unplaced = set()
+        degradations = []
+
+        if previous is None:
+            logger.info(f"No previous grouping for {research_id}, creating ad groups from scratch")
+            deliverable = await admit(lambda: llm_service.create_ad_groups(keywords, request))
+        else:
+            previous_keywords, previous_deliverable = previous
+            keyword_diff = BaseKeywordService.diff_keywords(previous_keywords, keywords)
+            logger.info(f"Keyword diff: {len(keyword_diff.added)} new, {len(keyword_diff.dropped)} dropped, "
+                        f"{len(keyword_diff.volume_changed)} volume changed")
+            if keyword_diff.is_empty():
+                deliverable = previous_deliverable
+            else:
+                update = await admit(lambda: llm_service.update_ad_groups(previous_deliverable, keyword_diff, request,
+                                                                          len(keywords)))
+                deliverable = update.deliverable
+                unplaced = {kw.keyword.lower() for kw in update.unplaced}
+                if update.placement_failed:
+                    degradations.append("placement_failed")
+
+        result = FinalKeywordResponse(
+            research_id=research_id,
+            total_keywords=len(keywords),
+            processing_time=processing_time,
+            deliverable=deliverable,
+            keyword_diff=keyword_diff,
+            degradations=degradations
+        )
+
+        if fell_back(deliverable) or degradations:
+            logger.warning(f"Not storing research {research_id}, ad group update fell back: {degradations}")
+            return result
+
+        # Unplaced new keywords stay out of the baseline, so the next refresh diffs them as new again
+        baseline = [kw for kw in keywords if kw.keyword.lower() not in unplaced] if unplaced else keywords
+        await asyncio.to_thread(snapshot_store.put_grouping, research_id, baseline, deliverable)
+        response.headers["ETag"] = result_store.put(research_id, request, result)
+        logger.info(f"Refresh completed in {time.time() - start_time:.1f}s")
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Keyword refresh failed after {time.time() - start_time:.1f}s: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Keyword refresh failed: {str(e)}")
+
+
+@router.get("/results/{research_id}", response_model=FinalKeywordResponse)
+async def get_stored_result(research_id: str, response: Response, if_none_match: Optional[str] = Header(None)):
+    """Fetch a stored research result by id, supports If-None-Match"""
+    stored = result_store.get(research_id)
+    if not stored:
+        raise HTTPException(status_code=404, detail=f"No stored result for id {research_id}")
+
+    result, etag = stored
+    if _etag_matches(etag, if_none_match):
+        return Response(status_code=304, headers={"ETag": etag})
+
+    response.headers["ETag"] = etag
+    return result
+
+
+@router.get("/export/{research_id}")
+async def export_stored_result(research_id: str, format: ExportFormat = "csv", scope: ExportScope = "ad_groups",
+                               campaign: Optional[str] = None, match_type: MatchType = "broad"):
+    """Stream a stored research as a Google Ads Editor CSV/TSV
+
+    scope: "ad_groups" (generated ad groups, one row per suggested match type) or "keywords" (every extracted keyword)
+    match_type: criterion type for the "keywords" scope
+    """
+    if not research_id.isalnum():
+        raise HTTPException(status_code=404, detail=f"No stored result for id {research_id}")
+
+    deliverable = await asyncio.to_thread(snapshot_store.get_grouping_deliverable, research_id)
+    if deliverable:
+        # Lazy: the keyword file is read line by line while the response streams
+        keywords = snapshot_store.iter_grouping_keywords(research_id) if scope == "keywords" else None
+    else:
+        stored = result_store.get(research_id)
+        if not stored:
+            raise HTTPException(status_code=404, detail=f"No stored result for id {research_id}")
+        if scope == "keywords":
+            raise HTTPException(status_code=404, detail=f"No stored keyword list for id {research_id}, run the research again")
+        keywords, deliverable = None, stored[0].deliverable
+
+    return _export_response(research_id, keywords, deliverable, format, scope, campaign, match_type)
+
+
+@router.post("/export")
+async def export_research(request: KeywordResearchRequest, format: ExportFormat = "csv", scope: ExportScope = "ad_groups",
+                          campaign: Optional[str] = None, match_type: MatchType = "broad",
+                          x_request_deadline: Optional[float] = Header(None), x_priority: Optional[str] = Header(None)):
+    """Run a research (batch admission lane by default) and stream it as a Google Ads Editor CSV/TSV
+
+    The result is stored like /search, so the same export is available later from GET /export/{research_id}
+    """
+    deadline = Deadline.from_request(request.deadline_seconds, x_request_deadline)
+    result, keywords, _ = await research_and_store(request, deadline, x_priority or "batch")
+    return _export_response(result.research_id, keywords, result.deliverable, format, scope, campaign, match_type)
+
+
+def _export_response(research_id: str, keywords: Optional[Iterable[KeywordData]], deliverable: Optional[SimplifiedDeliverable],
+                     file_format: str, scope: str, campaign: Optional[str], match_type: str) -> StreamingResponse:
+    rows = export_rows(scope, keywords, deliverable, campaign or default_campaign_name(research_id), match_type)
+    # Sync generator: Starlette writes it from a worker thread chunk by chunk
+    return StreamingResponse(
+        stream_rows(rows, file_format),
+        media_type=MEDIA_TYPES[file_format],
+        headers={"Content-Disposition": f'attachment; filename="{export_filename(research_id, scope, file_format)}"'}
+    )
+
+
+@router.post("/overlap", response_model=OverlapResponse)
+async def keyword_overlap(request: OverlapRequest, max_snapshot_age: int = SNAPSHOT_MAX_AGE,
+                          x_priority: Optional[str] = Header(None)):
+    """Brand vs competitors: shared, gap and unique keywords plus ranked Competitor Terms candidates
+
+    Exact unless the request asks for method="estimate" (HyperLogLog/MinHash, see method in the response).
+    Site keywords younger than max_snapshot_age seconds are reused from snapshots
+    """
+    async def analyze(admit: Admit) -> OverlapResponse:
+        try:
+            return await get_base_keyword_service().analyze_overlap(request, snapshot_store, max_snapshot_age, admit)
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Overlap analysis failed: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Overlap analysis failed: {str(e)}")
+
+    return await run_staged(x_priority or "interactive", request.api_mode, analyze)
+
+
+@router.get("/related", response_model=KeywordResponse)
+async def related_keywords(q: str, location: str, language: str = "English", min_search_volume: int = 0,
+                           limit: int = Query(100, ge=1, le=RELATED_MAX_LIMIT)):
+    """Related keywords from the local index of past research, no upstream call"""
+    start_time = time.time()
+    found = (await get_keyword_index().lookup_async([q], location, language, min_search_volume, limit=limit))[0]
+    return KeywordResponse(
+        total_keywords=len(found),
+        filtered_keywords=len(found),
+        keywords=found,
+        processing_time=round(time.time() - start_time, 4)
+    )
+
+
+@router.get("/admission")
+async def admission_stats():
+    """In-flight count, queue depth and wait times per admission lane"""
+    return admission.stats()
+
+
+@router.get("/cache-warmer")
+async def cache_warmer_stats():
+    """Hit and warm-hit ratios of max_age lookups, upstream budget use and the hottest tracked research"""
+    return cache_warmer.stats()
+
+
+@router.get("/llm-models")
+async def llm_model_stats():
+    """Model ladder config and per-model attempts, validation failure rate, latency and token usage"""
+    llm_service = get_llm_service()
+    return {
+        "ladder": [rung._asdict() for rung in llm_service.ladder.rungs],
+        "race_after": llm_service.ladder.race_after,
+        "models": llm_service.model_stats.stats(),
+    }
+
+
+@router.get("/standard-tasks")
+async def standard_task_stats():
+    """Queued DataForSEO tasks waiting for results, poll interval and counters"""
+    return get_task_scheduler().stats()
+
+
+async def run_admitted(lane: str, pipeline: Callable[[], Awaitable[T]], deadline: Optional[Deadline] = None) -> T:
+    """Runs pipeline() in an admission slot, 429 with Retry-After when the lane is full or the deadline runs out queued"""
+    try:
+        async with admission.slot(lane, deadline.remaining() if deadline else None):
+            return await pipeline()
+    except AdmissionRejected as e:
+        logger.warning(f"Admission rejected: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+async def run_now(stage: Callable[[], Awaitable[T]]) -> T:
+    return await stage()
+
+
+async def run_staged(lane: str, api_mode: Optional[str], pipeline: Callable[[Admit], Awaitable[T]],
+                     deadline: Optional[Deadline] = None) -> T:
+    """
+    Live mode: the whole pipeline holds one admission slot. Standard mode: queued DataForSEO tasks can wait upstream
+    for minutes, so fetching runs without a slot (the task scheduler bounds it) and only the CPU/LLM stages the
+    pipeline hands to admit() take one
+    """
+    if (api_mode or DATAFORSEO_MODE) == "standard":
+        return await pipeline(lambda stage: run_admitted(lane, stage, deadline))
+    return await run_admitted(lane, lambda: pipeline(run_now), deadline)
+
+
+def _etag_matches(etag: str, if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+
+
+async def run_research(request: KeywordResearchRequest, deadline: Optional[Deadline] = None,
+                       admit: Admit = run_now) -> Tuple[FinalKeywordResponse, List[KeywordData]]:
+    """Runs the full extraction + LLM pipeline for one request, returns the response and all extracted keywords"""
     start_time = time.time()
     
     try:
@@ -29,8 +351,8 @@ async def research_keywords(request: KeywordResearchRequest):
         # Use your BaseKeywordService to orchestrate all APIs
         # Step 1: Generating Keywords
         logger.info("Starting keyword extraction")
-        base_service = BaseKeywordService()
-        keywords = await base_service.extract_all_keywords(request)
+        base_service = get_base_keyword_service()
+        keywords = await base_service.extract_all_keywords(request, deadline, snapshot_store)
         
         processing_time = time.time() - start_time
         logger.info(f"Keyword extraction completed: {len(keywords)} keywords in {processing_time:.1f}s")
@@ -45,8 +367,8 @@ async def research_keywords(request: KeywordResearchRequest):
 
         # Step 2: LLM Integration
         logger.info("Starting LLM service for ad group creation")
-        llm_service = LLMService()
-        deliverable = await llm_service.create_ad_groups(keywords, request)
+        llm_service = get_llm_service()
+        deliverable = await admit(lambda: llm_service.create_ad_groups(keywords, request, deadline))
 
 
         # Step 3: Return complete response
@@ -57,9 +379,12 @@ async def research_keywords(request: KeywordResearchRequest):
         return FinalKeywordResponse(
             total_keywords=len(keywords),
             processing_time=processing_time,  # Just extraction time
-            deliverable=deliverable  # LLM result with its own processing_time
-        )
-        
+            deliverable=deliverable,  # LLM result with its own processing_time
+            degradations=deadline.cuts if deadline else []
+        ), keywords
+
+    except HTTPException:
+        raise
     except Exception as e:
         total_time = time.time() - start_time
         logger.error(f"Keyword research failed after {total_time:.1f}s: {str(e)}")
@@ -73,9 +398,17 @@ async def health_check():
     return {"status": "healthy", "message": "Keyword service is running"}
 
 
+@router.get("/ready")
+async def readiness_check(response: Response):
+    """Readiness endpoint, 503 until the startup warm-up has finished"""
+    if not startup_state["ready"]:
+        response.status_code = 503
+    return {"ready": startup_state["ready"], "timings": startup_state["timings"], "errors": startup_state["errors"]}
+
+
 @router.post("/search-from-config", response_model=FinalKeywordResponse)
-async def research_keywords_from_config():
-    """Research keywords using config.yaml file"""
+async def research_keywords_from_config(response: Response, x_priority: Optional[str] = Header(None)):
+    """Research keywords using config.yaml file (batch admission lane by default)"""
     logger.info("Starting keyword research from config file")
     
     try:
@@ -87,8 +420,12 @@ async def research_keywords_from_config():
         request = KeywordResearchRequest(**config_data)
         
         # Use your existing research_keywords function
-        return await research_keywords(request)
+        return await research_keywords(request, response, if_none_match=None, x_request_deadline=None,
+                                       x_priority=x_priority or "batch")
         
     except Exception as e:
+        # Admission rejections keep their 429 + Retry-After
+        if isinstance(e, HTTPException) and e.status_code == 429:
+            raise
         logger.error(f"Config-based research failed: {str(e)}")
         raise HTTPException(status_code=422, detail=f"Config processing failed: {str(e)}")
\ No newline at end of file
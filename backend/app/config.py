@@ -6,4 +6,68 @@ load_dotenv()
 KEYWORDS_FOR_SITE_API_AUTH = os.getenv("KEYWORDS_FOR_SITE_API_AUTH")
 KEYWORDS_FOR_KEYWORDS_API_AUTH = os.getenv("KEYWORDS_FOR_KEYWORDS_API_AUTH") 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
\ No newline at end of file
+ALLOWED_ORIGINS = os.getenv("ALLOWED_ORIGINS", "http://localhost:3000,http://localhost:5173").split(",")
+# Local storage for completed research results
+RESULT_STORE_DIR = os.getenv("RESULT_STORE_DIR", "data/results")
+
+# Per-source keyword snapshots used by incremental re-research
+SNAPSHOT_STORE_DIR = os.getenv("SNAPSHOT_STORE_DIR", "data/snapshots")
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", str(7 * 24 * 3600)))  # seconds
+
+# Max concurrent upstream calls when a request fans out over several locations/languages
+FANOUT_CONCURRENCY = int(os.getenv("FANOUT_CONCURRENCY", "5"))
+
+# Startup / connection pooling
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+PREWARM_CONNECTIONS = os.getenv("PREWARM_CONNECTIONS", "false").lower() in ("1", "true", "yes")
+
+# Where CPU-bound pipeline stages run: "inline" (event loop), "thread" or "process"
+EXECUTOR_MODE = os.getenv("EXECUTOR_MODE", "thread").lower()
+EXECUTOR_WORKERS = int(os.getenv("EXECUTOR_WORKERS", str(min(4, os.cpu_count() or 1))))
+OFFLOAD_MIN_ITEMS = int(os.getenv("OFFLOAD_MIN_ITEMS", "1000"))  # smaller inputs always run inline
+
+# Request deadline budget (seconds): time kept for the LLM stage, skip it below LLM_MIN_SECONDS
+# and shorten it (fewer keywords, fewer tokens) below LLM_SHORTEN_BELOW_SECONDS
+LLM_RESERVE_SECONDS = float(os.getenv("LLM_RESERVE_SECONDS", "20"))
+LLM_MIN_SECONDS = float(os.getenv("LLM_MIN_SECONDS", "5"))
+LLM_SHORTEN_BELOW_SECONDS = float(os.getenv("LLM_SHORTEN_BELOW_SECONDS", "30"))
+
+# Admission control for the research endpoints: in-flight cap, queue sizes per lane, max queue wait (seconds)
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "8"))
+ADMISSION_BATCH_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_BATCH_MAX_IN_FLIGHT", str(max(1, ADMISSION_MAX_IN_FLIGHT // 2))))
+ADMISSION_MAX_QUEUE_INTERACTIVE = int(os.getenv("ADMISSION_MAX_QUEUE_INTERACTIVE", "16"))
+ADMISSION_MAX_QUEUE_BATCH = int(os.getenv("ADMISSION_MAX_QUEUE_BATCH", "64"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+
+# Local index of every keyword seen upstream, consulted before the keywords_for_keywords API
+KEYWORD_INDEX_ENABLED = os.getenv("KEYWORD_INDEX_ENABLED", "true").lower() in ("1", "true", "yes")
+KEYWORD_INDEX_PATH = os.getenv("KEYWORD_INDEX_PATH", "data/keyword_index.sqlite3")
+KEYWORD_INDEX_MAX_AGE = int(os.getenv("KEYWORD_INDEX_MAX_AGE", str(30 * 24 * 3600)))  # seconds
+KEYWORD_INDEX_MIN_PER_SEED = int(os.getenv("KEYWORD_INDEX_MIN_PER_SEED", "10"))  # below this upstream is called
+RELATED_MAX_LIMIT = int(os.getenv("RELATED_MAX_LIMIT", "1000"))  # largest /related page
+
+# DataForSEO call mode: "live" (one blocking call per lookup) or "standard" (task_post + polling, cheaper for bulk runs)
+DATAFORSEO_MODE = os.getenv("DATAFORSEO_MODE", "live").lower()
+STANDARD_POLL_MIN_SECONDS = float(os.getenv("STANDARD_POLL_MIN_SECONDS", "5"))
+STANDARD_POLL_MAX_SECONDS = float(os.getenv("STANDARD_POLL_MAX_SECONDS", "60"))
+STANDARD_MAX_IN_FLIGHT = int(os.getenv("STANDARD_MAX_IN_FLIGHT", "1000"))
+STANDARD_TASK_TIMEOUT = float(os.getenv("STANDARD_TASK_TIMEOUT", str(2 * 3600)))  # seconds
+STANDARD_GET_CONCURRENCY = int(os.getenv("STANDARD_GET_CONCURRENCY", "10"))
+
+# Background cache warmer: re-runs frequently requested research before clients' max_age runs out.
+# Budget is counted in DataForSEO calls per rolling 24h, warm runs are spaced by CACHE_WARM_MIN_SPACING_SECONDS
+CACHE_WARM_ENABLED = os.getenv("CACHE_WARM_ENABLED", "false").lower() in ("1", "true", "yes")
+CACHE_WARM_CHECK_SECONDS = float(os.getenv("CACHE_WARM_CHECK_SECONDS", "60"))
+CACHE_WARM_LEAD_SECONDS = float(os.getenv("CACHE_WARM_LEAD_SECONDS", "3600"))
+CACHE_WARM_DAILY_UPSTREAM_BUDGET = int(os.getenv("CACHE_WARM_DAILY_UPSTREAM_BUDGET", "200"))
+CACHE_WARM_MIN_SPACING_SECONDS = float(os.getenv("CACHE_WARM_MIN_SPACING_SECONDS", "30"))
+CACHE_WARM_HALF_LIFE = float(os.getenv("CACHE_WARM_HALF_LIFE", str(24 * 3600)))  # seconds, request frequency decay
+CACHE_WARM_MIN_SCORE = float(os.getenv("CACHE_WARM_MIN_SCORE", "2"))  # decayed request count needed to be warmed
+CACHE_WARM_MAX_TRACKED = int(os.getenv("CACHE_WARM_MAX_TRACKED", "1000"))
+
+# Ad-group generation model ladder: fast model first, the next one only when the answer fails validation.
+# "model:max_tokens" overrides LLM_MAX_TOKENS per model. LLM_RACE_AFTER_SECONDS > 0 starts the next model
+# next to a slow one after that many seconds and keeps the first valid answer
+LLM_MODEL_LADDER = os.getenv("LLM_MODEL_LADDER", "gpt-4o-mini,gpt-4o")
+LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "5000"))
+LLM_RACE_AFTER_SECONDS = float(os.getenv("LLM_RACE_AFTER_SECONDS", "0")) or None
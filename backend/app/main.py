@@ -2,11 +2,13 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1.router import api_router
 from app.config import ALLOWED_ORIGINS 
+from app.startup import lifespan
 
 app = FastAPI(
     title="Keyword Search API",
     description="Automated keyword search",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS for frontend
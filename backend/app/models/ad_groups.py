@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Optional
+from .keyword import KeywordDiff
 
 class SimpleKeyword(BaseModel):
     keyword: str
@@ -24,11 +25,22 @@ class SimplifiedDeliverable(BaseModel):
     total_keywords_used: int
     budget_summary: dict  # Simple breakdown by group type
     processing_time: float
+    generated_by: Optional[str] = None  # Model that produced the groups, "local_rules" for the rule-based grouping
 
 class FinalKeywordResponse(BaseModel):
+    # Hash of the normalized request, used to fetch the stored result later
+    research_id: Optional[str] = None
+
     # Basic extraction data
     total_keywords: int
     processing_time: float
     
     # LLM-generated ad groups
     deliverable: Optional[SimplifiedDeliverable] = None
+
+    # Set on incremental refreshes: what changed since the previous run
+    keyword_diff: Optional[KeywordDiff] = None
+
+    # What the deadline budget cut, e.g. "source_timed_out:site:...", "llm_skipped:local_grouping",
+    # or "placement_failed" when a refresh couldn't place its new keywords
+    degradations: List[str] = []
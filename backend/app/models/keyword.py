@@ -7,6 +7,15 @@ class CompetitionLevel(str, Enum):
     MEDIUM = "medium"
     HIGH = "high"
 
+class LocaleMetrics(BaseModel):
+    location: str
+    language: str
+    search_volume: int
+    competition_level: CompetitionLevel
+    bid_low: float
+    bid_high: float
+    cpc: float
+
 class KeywordData(BaseModel):
     keyword: str
     search_volume: int
@@ -15,7 +24,17 @@ class KeywordData(BaseModel):
     bid_high: float
     cpc:float
     concept_groups: Optional[List[str]] = []  # NEW: For deliverable 1
+    locale_metrics: Optional[List[LocaleMetrics]] = []  # Only filled for multi-location/language requests
 
 class KeywordList(BaseModel):
     keywords: list[KeywordData]
     total_count: int
+
+class KeywordDiff(BaseModel):
+    # Changes between the previous and current keyword set of a research
+    added: List[KeywordData] = []
+    dropped: List[KeywordData] = []
+    volume_changed: List[KeywordData] = []  # Carries the new values
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.dropped or self.volume_changed)
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, HttpUrl
-from typing import Optional
+from pydantic import BaseModel, HttpUrl, model_validator
+from typing import Optional, Literal
 
 class KeywordResearchRequest(BaseModel):
     # For minimal site content (Scenario 1)
@@ -8,9 +8,56 @@ class KeywordResearchRequest(BaseModel):
     # Required inputs
     brand_website: HttpUrl
     competitor_website: HttpUrl
-    location: str
+    location: Optional[str] = None
     shopping_ads_budget: float
     search_ads_budget: float
     pmax_ads_budget: float
     min_search_volume: int
+
+    # Multi-market research: every location x language pair is fetched
+    locations: Optional[list[str]] = None
+    language_name: str = "English"
+    languages: Optional[list[str]] = None
+
+    # Latency bound for the whole pipeline in seconds (the X-Request-Deadline header works too)
+    deadline_seconds: Optional[float] = None
+
+    # DataForSEO "live" or queued "standard" endpoints, defaults to the DATAFORSEO_MODE setting
+    api_mode: Optional[Literal["live", "standard"]] = None
+
+    @model_validator(mode="after")
+    def check_location(self):
+        if not self.location and not self.locations:
+            raise ValueError("location or locations is required")
+        return self
+
+    def get_locations(self) -> list[str]:
+        """location + locations, duplicates removed, order kept"""
+        locations = ([self.location] if self.location else []) + (self.locations or [])
+        return list(dict.fromkeys(loc.strip() for loc in locations if loc.strip()))
+
+    def get_languages(self) -> list[str]:
+        languages = self.languages or [self.language_name]
+        return list(dict.fromkeys(lang.strip() for lang in languages if lang.strip()))
     
+
+
+class OverlapRequest(BaseModel):
+    # Brand vs many competitors on one market
+    brand_website: HttpUrl
+    competitor_websites: list[HttpUrl]
+    location: str
+    language_name: str = "English"
+    min_search_volume: int = 0
+
+    # "auto" and "exact" use exact set operations, "estimate" opts into HyperLogLog/MinHash sketches
+    # (about half the memory, no faster and off by 5-20% on shared/unique counts)
+    method: Literal["auto", "exact", "estimate"] = "auto"
+    max_candidates: int = 50
+    api_mode: Optional[Literal["live", "standard"]] = None
+
+    @model_validator(mode="after")
+    def check_competitors(self):
+        if not self.competitor_websites:
+            raise ValueError("competitor_websites needs at least one website")
+        return self
@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from typing import List
 from .keyword import KeywordData
 
 class KeywordResponse(BaseModel):
@@ -10,3 +11,32 @@ class KeywordResponse(BaseModel):
 class HealthResponse(BaseModel):
     status: str
     message: str
+
+class CompetitorOverlap(BaseModel):
+    competitor_website: str
+    total_keywords: int
+    shared_with_brand: int        # Both rank for it
+    gap_keywords: int             # Competitor ranks for it, brand doesn't
+    brand_only_keywords: int      # Brand ranks for it, this competitor doesn't
+    unique_keywords: int          # Only this competitor, not the brand or any other competitor
+    jaccard: float
+
+class CompetitorSimilarity(BaseModel):
+    competitor_a: str
+    competitor_b: str
+    jaccard: float
+
+class GapCandidate(BaseModel):
+    keyword: KeywordData
+    competitor_count: int         # Competitors that rank for it
+    competitor_website: str       # Where the reported metrics come from (highest volume)
+
+class OverlapResponse(BaseModel):
+    method: str                   # "exact" or "estimate"
+    brand_website: str
+    brand_keywords: int
+    total_gap_keywords: int       # In at least one competitor, not in the brand set
+    competitors: List[CompetitorOverlap]
+    competitor_similarity: List[CompetitorSimilarity]
+    competitor_term_candidates: List[GapCandidate]  # Gap keywords ranked for the Competitor Terms ad group
+    processing_time: float
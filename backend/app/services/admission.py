@@ -0,0 +1,146 @@
+import asyncio
+import math
+import time
+import logging
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, AsyncIterator, Optional
+from app.config import (
+    ADMISSION_MAX_IN_FLIGHT, ADMISSION_BATCH_MAX_IN_FLIGHT, ADMISSION_MAX_QUEUE_INTERACTIVE,
+    ADMISSION_MAX_QUEUE_BATCH, ADMISSION_MAX_WAIT_SECONDS
+)
+
+logger = logging.getLogger(__name__)
+
+# Highest priority first: queued interactive (UI) requests always start before queued batch ones
+LANES = ("interactive", "batch")
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        super().__init__(f"{lane} lane {reason}, retry after {retry_after}s")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+
+    # Caps how many research pipelines run at once, with a bounded wait queue per priority lane
+    def __init__(self, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 batch_max_in_flight: int = ADMISSION_BATCH_MAX_IN_FLIGHT,
+                 max_queue: Dict[str, int] = None, max_wait: float = ADMISSION_MAX_WAIT_SECONDS):
+        self.max_in_flight = max_in_flight
+        # Batch never takes every slot, so UI traffic always has room
+        self.batch_max_in_flight = min(batch_max_in_flight, max(1, max_in_flight - 1))
+        self.max_queue = max_queue or {"interactive": ADMISSION_MAX_QUEUE_INTERACTIVE, "batch": ADMISSION_MAX_QUEUE_BATCH}
+        self.max_wait = max_wait
+
+        self.in_flight = {lane: 0 for lane in LANES}
+        self.queues: Dict[str, deque] = {lane: deque() for lane in LANES}
+        self.counters = {lane: {"admitted": 0, "rejected_queue_full": 0, "rejected_wait_timeout": 0,
+                                "rejected_deadline": 0} for lane in LANES}
+        self.recent_waits = {lane: deque(maxlen=500) for lane in LANES}
+        self.avg_service_time = 30.0  # seconds, moving average used for Retry-After
+
+    def _can_start(self, lane: str) -> bool:
+        if sum(self.in_flight.values()) >= self.max_in_flight:
+            return False
+        return lane != "batch" or self.in_flight["batch"] < self.batch_max_in_flight
+
+    def _retry_after(self, lane: str) -> int:
+        waiting = sum(len(self.queues[l]) for l in LANES[:LANES.index(lane) + 1])
+        return max(1, math.ceil(self.avg_service_time * (waiting + 1) / max(1, self.max_in_flight)))
+
+    def _grant(self, lane: str, wait: float):
+        self.in_flight[lane] += 1
+        self.counters[lane]["admitted"] += 1
+        self.recent_waits[lane].append(wait)
+
+    def _dispatch(self):
+        """Hands free slots to queued requests, higher priority lanes first"""
+        for lane in LANES:
+            queue = self.queues[lane]
+            while queue and self._can_start(lane):
+                future, queued_at = queue.popleft()
+                if future.done():  # waiter gave up (timeout / client disconnect)
+                    continue
+                self._grant(lane, time.monotonic() - queued_at)
+                future.set_result(None)
+
+    async def _acquire(self, lane: str, deadline_left: Optional[float] = None):
+        higher_waiting = any(self.queues[l] for l in LANES[:LANES.index(lane) + 1])
+        if not higher_waiting and self._can_start(lane):
+            self._grant(lane, 0.0)
+            return
+
+        if len(self.queues[lane]) >= self.max_queue[lane]:
+            self.counters[lane]["rejected_queue_full"] += 1
+            raise AdmissionRejected(lane, "queue full", self._retry_after(lane))
+
+        # A request deadline shorter than max_wait bounds the wait: starting with no budget left only burns upstream calls
+        by_deadline = deadline_left is not None and deadline_left < self.max_wait
+        future = asyncio.get_running_loop().create_future()
+        entry = (future, time.monotonic())
+        self.queues[lane].append(entry)
+        try:
+            await asyncio.wait_for(future, max(0.0, deadline_left) if by_deadline else self.max_wait)
+        except asyncio.TimeoutError:
+            if entry in self.queues[lane]:
+                self.queues[lane].remove(entry)
+            reason = "deadline exceeded while queued" if by_deadline else "wait timeout"
+            self.counters[lane]["rejected_deadline" if by_deadline else "rejected_wait_timeout"] += 1
+            raise AdmissionRejected(lane, reason, self._retry_after(lane))
+        except asyncio.CancelledError:
+            # Slot may have been granted right before the client went away
+            if future.done() and not future.cancelled():
+                self._release(lane)
+            elif entry in self.queues[lane]:
+                self.queues[lane].remove(entry)
+            raise
+
+    def _release(self, lane: str):
+        self.in_flight[lane] -= 1
+        self._dispatch()
+
+    def is_idle_for(self, lane: str) -> bool:
+        """True when a request in `lane` would start right away without waiting behind anyone"""
+        higher_waiting = any(self.queues[l] for l in LANES[:LANES.index(lane) + 1])
+        return not higher_waiting and self._can_start(lane)
+
+    @asynccontextmanager
+    async def slot(self, lane: str, deadline_left: Optional[float] = None) -> AsyncIterator[None]:
+        """Holds one in-flight slot for the duration of the block, raises AdmissionRejected when full
+
+        deadline_left: seconds left of the request deadline, the queue wait never outlasts it
+        """
+        if lane not in LANES:
+            lane = "interactive"
+        await self._acquire(lane, deadline_left)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.avg_service_time = 0.8 * self.avg_service_time + 0.2 * (time.monotonic() - start)
+            self._release(lane)
+
+    def stats(self) -> dict:
+        lanes = {}
+        for lane in LANES:
+            waits = sorted(self.recent_waits[lane])
+            lanes[lane] = {
+                "in_flight": self.in_flight[lane],
+                "queue_depth": len(self.queues[lane]),
+                "max_queue": self.max_queue[lane],
+                "wait_p50": round(waits[len(waits) // 2], 3) if waits else 0.0,
+                "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 3) if waits else 0.0,
+                "wait_max": round(waits[-1], 3) if waits else 0.0,
+                **self.counters[lane],
+            }
+        return {
+            "max_in_flight": self.max_in_flight,
+            "batch_max_in_flight": self.batch_max_in_flight,
+            "in_flight": sum(self.in_flight.values()),
+            "avg_service_time": round(self.avg_service_time, 2),
+            "lanes": lanes,
+        }
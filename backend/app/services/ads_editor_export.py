@@ -0,0 +1,90 @@
+import csv
+import io
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+from app.models.keyword import KeywordData
+from app.models.ad_groups import SimplifiedDeliverable
+
+# Google Ads Editor bulk-upload columns for keywords
+ADS_EDITOR_COLUMNS = ("Campaign", "Ad Group", "Keyword", "Criterion Type", "Max CPC")
+CRITERION_TYPES = {"exact": "Exact", "phrase": "Phrase", "broad": "Broad"}
+DELIMITERS = {"csv": ",", "tsv": "\t"}
+MEDIA_TYPES = {"csv": "text/csv", "tsv": "text/tab-separated-values"}
+
+# Rows written per yielded chunk, big enough to keep per-chunk overhead low, small enough to stay a few hundred KB
+ROWS_PER_CHUNK = 2000
+
+# Ad group for keywords that aren't in any generated ad group and have no concept group
+UNGROUPED_AD_GROUP = "Other keywords"
+
+ExportRow = Tuple[str, str, str, str, str]
+
+
+def _max_cpc(bid_high: float, cpc: float = 0.0) -> str:
+    # Top of page high bid, average CPC when DataForSEO has no bid range
+    return f"{bid_high or cpc:.2f}"
+
+
+def ad_group_rows(deliverable: SimplifiedDeliverable, campaign: str) -> Iterator[ExportRow]:
+    """One row per keyword and suggested match type of every generated ad group"""
+    for group in deliverable.ad_groups:
+        if group.group_type == "error":
+            continue
+        for kw in group.keywords:
+            for match_type in kw.suggested_match_types or ["broad"]:
+                criterion = CRITERION_TYPES.get(match_type.lower())
+                if criterion:
+                    yield campaign, group.group_name, kw.keyword, criterion, _max_cpc(kw.cpc_high)
+
+
+def keyword_rows(keywords: Iterable[KeywordData], deliverable: Optional[SimplifiedDeliverable], campaign: str,
+                 match_type: str = "broad") -> Iterator[ExportRow]:
+    """
+    Every extracted keyword, not just the ones the LLM picked. Keywords in a generated ad group go there,
+    the rest are grouped by their first concept group
+    """
+    group_of: Dict[str, str] = {}
+    if deliverable:
+        for group in deliverable.ad_groups:
+            if group.group_type != "error":
+                for kw in group.keywords:
+                    group_of.setdefault(kw.keyword.lower(), group.group_name)
+
+    criterion = CRITERION_TYPES[match_type]
+    for kw in keywords:
+        ad_group = group_of.get(kw.keyword.lower()) or (kw.concept_groups[0] if kw.concept_groups else UNGROUPED_AD_GROUP)
+        yield campaign, ad_group, kw.keyword, criterion, _max_cpc(kw.bid_high, kw.cpc)
+
+
+def stream_rows(rows: Iterable[ExportRow], file_format: str = "csv", rows_per_chunk: int = ROWS_PER_CHUNK) -> Iterator[str]:
+    """Header + rows as text chunks, only one chunk is held in memory at a time"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, delimiter=DELIMITERS[file_format], lineterminator="\r\n")
+    writer.writerow(ADS_EDITOR_COLUMNS)
+
+    pending = 1
+    for row in rows:
+        writer.writerow(row)
+        pending += 1
+        if pending >= rows_per_chunk:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if pending:
+        yield buffer.getvalue()
+
+
+def export_filename(research_id: str, scope: str, file_format: str) -> str:
+    return f"{research_id}-{scope.replace('_', '-')}.{file_format}"
+
+
+def default_campaign_name(research_id: str) -> str:
+    return f"Keyword Research {research_id[:8]}"
+
+
+def export_rows(scope: str, keywords: Optional[Iterable[KeywordData]], deliverable: Optional[SimplifiedDeliverable],
+                campaign: str, match_type: str = "broad") -> Iterator[ExportRow]:
+    if scope == "keywords":
+        return keyword_rows(keywords or [], deliverable, campaign, match_type)
+    return ad_group_rows(deliverable, campaign) if deliverable else iter(())
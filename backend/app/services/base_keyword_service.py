@@ -1,89 +1,417 @@
 import asyncio
-from typing import List
-from app.models.keyword import KeywordData
-from app.models.requests import KeywordResearchRequest
+import time
+from typing import List, Dict, Tuple, Callable, Awaitable, NamedTuple, Optional
+from app.models.keyword import KeywordData, KeywordDiff, LocaleMetrics
+from app.models.requests import KeywordResearchRequest, OverlapRequest
+from app.models.responses import OverlapResponse, CompetitorOverlap, CompetitorSimilarity, GapCandidate
 from app.services.keywords_for_site import KeywordsForSiteService
 from app.services.keywords_for_keywords import KeywordsForKeywordsService
+from app.services.snapshot_store import SnapshotStore
+from app.services.executor import run_cpu
+from app.services.deadline import Deadline
+from app.services.overlap import COMPETITOR_GAP_CONCEPT, compute_overlap, overlap_rows
+from app.config import FANOUT_CONCURRENCY, DATAFORSEO_MODE
+
+# Relative search volume change that counts as "volume changed" in a diff
+VOLUME_CHANGE_THRESHOLD = 0.1
+
+
+class KeywordSource(NamedTuple):
+    source: str  # "seeds" or "site"
+    target: str  # website url or joined seed keywords
+    location: str
+    language: str
+    role: str  # "seeds", "brand" or "competitor"
+    fetch: Callable[[], Awaitable[List[KeywordData]]]
+
 
 class BaseKeywordService:
-    
+
     # Orchestrating all APIs
     # Factory pattern used for simplicity and not dependency injection
     def __init__(self):
         self.keywords_for_site_service = KeywordsForSiteService()
         self.keywords_for_keywords_service = KeywordsForKeywordsService()
-    
-    async def extract_all_keywords(self, request: KeywordResearchRequest) -> List[KeywordData]:
+
+    async def extract_all_keywords(self, request: KeywordResearchRequest, deadline: Optional[Deadline] = None,
+                                   snapshot_store: Optional[SnapshotStore] = None) -> List[KeywordData]:
         """
         Extract keywords from all sources concurrently so httpx used instead of normal requests:
-        - Scenario 1: seed_keywords + brand + competitor (3 API calls)
-        - Scenario 2: brand + competitor only (2 API calls)
+        - Scenario 1: seed_keywords + brand + competitor (3 API calls per location/language)
+        - Scenario 2: brand + competitor only (2 API calls per location/language)
+        With a deadline, sources still running when the extraction budget runs out are cancelled
+        and the ones that finished are used. With a snapshot_store, non-empty source results are
+        snapshotted so the next /refresh can reuse them
         """
-        tasks = []
-        location = request.location  # Use first location from list
-        min_search_volume = request.min_search_volume
-        
-        # Task 1: Seed keywords (if provided) - KeywordsForKeywords API
-        if request.seed_keywords and len(request.seed_keywords) > 0:
-            tasks.append(
-                self.keywords_for_keywords_service.get_keywords_from_seeds(
-                    keywords=request.seed_keywords,
-                    location=location,
-                    min_search_volume=min_search_volume
-                )
-            )
-        
-        # Task 2: Brand website - KeywordsForSite API  
-        tasks.append(
-            self.keywords_for_site_service.get_keywords_from_site(
-                website_url=str(request.brand_website),
-                location=location,
-                min_search_volume=min_search_volume
-            )
-        )
-        
-        # Task 3: Competitor website - KeywordsForSite API
-        tasks.append(
-            self.keywords_for_site_service.get_keywords_from_site(
-                website_url=str(request.competitor_website),
-                location=location,
-                min_search_volume=min_search_volume
-            )
-        )
-        
-        # Execute all tasks concurrently using asyncio.gather
+        sources = self._build_sources(request)
+        semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+        tasks = [asyncio.ensure_future(self._bounded(semaphore, source.fetch)) for source in sources]
+
+        # Execute all tasks concurrently, at most FANOUT_CONCURRENCY in flight
         print(f"Starting {len(tasks)} API calls concurrently...")
-        results = await asyncio.gather(*tasks, return_exceptions=True) 
-        
-        # *tasks-> unpacks the list's elements
-        # with return_exceptions = true, whole thing doesn't crash as we append the exception(e) in results
+        timeout = deadline.extraction_budget() if deadline else None
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        results = []
+        for source, task in zip(sources, tasks):
+            if task in pending:
+                deadline.cut(f"source_timed_out:{source.source}:{source.target}:{source.location}/{source.language}")
+                results.append(asyncio.TimeoutError("extraction budget exceeded"))
+            else:
+                results.append(task.exception() or task.result())
+
+        # Like gather(return_exceptions=True): a failed source leaves its exception in results instead of crashing
 
         # Combine all results and handle exceptions
-        all_keywords = []
+        source_results = []
         for i, result in enumerate(results):
             if isinstance(result, Exception):
                 print(f"Task {i+1} failed: {str(result)}")
+                source_results.append([])
                 continue
-            
-            if isinstance(result, list):
-                all_keywords.extend(result)
-                print(f"Task {i+1} returned {len(result)} keywords")
-        
-        # Remove duplicates based on keyword text
-        unique_keywords = self._remove_duplicates(all_keywords)
-        
+
+            source_results.append(result if isinstance(result, list) else [])
+            print(f"Task {i+1} returned {len(source_results[-1])} keywords")
+
+        if snapshot_store is not None:
+            await asyncio.gather(*[self._put_snapshot(snapshot_store, self._source_key(source, request), result)
+                                   for source, result in zip(sources, source_results) if result])
+
+        unique_keywords = await self._combine(sources, source_results)
+
         print(f"Total unique keywords extracted: {len(unique_keywords)}")
         return unique_keywords
-    
 
-    def _remove_duplicates(self, keywords: List[KeywordData]) -> List[KeywordData]:
-        
+
+    def _build_sources(self, request: KeywordResearchRequest, max_age: Optional[float] = None) -> List[KeywordSource]:
+        """
+        One entry per upstream call, for every location x language pair:
+        - Scenario 1: seed_keywords + brand + competitor (3 API calls)
+        - Scenario 2: brand + competitor only (2 API calls)
+        DataForSEO live endpoints take one task per call, so identical lookups are only deduplicated.
+        max_age (seconds) bounds how old local keyword index answers for seeds may be
+        """
+        sources = []
+        seen = set()
+        min_search_volume = request.min_search_volume
+        mode = request.api_mode or DATAFORSEO_MODE
+
+        for location in request.get_locations():
+            for language in request.get_languages():
+
+                # Source 1: Seed keywords (if provided) - KeywordsForKeywords API
+                if request.seed_keywords and len(request.seed_keywords) > 0:
+                    seeds = request.seed_keywords
+                    sources.append(KeywordSource(
+                        "seeds",
+                        ",".join(sorted(kw.strip().lower() for kw in seeds)),
+                        location,
+                        language,
+                        "seeds",
+                        lambda location=location, language=language: self.keywords_for_keywords_service.get_keywords_from_seeds(
+                            keywords=seeds,
+                            location=location,
+                            min_search_volume=min_search_volume,
+                            language=language,
+                            mode=mode,
+                            max_age=max_age
+                        )
+                    ))
+
+                # Source 2 and 3: Brand and competitor website - KeywordsForSite API
+                for role, website in (("brand", str(request.brand_website)), ("competitor", str(request.competitor_website))):
+                    if (website, location, language) in seen:
+                        continue
+                    seen.add((website, location, language))
+                    sources.append(KeywordSource(
+                        "site",
+                        website,
+                        location,
+                        language,
+                        role,
+                        lambda website=website, location=location, language=language: self.keywords_for_site_service.get_keywords_from_site(
+                            website_url=website,
+                            location=location,
+                            min_search_volume=min_search_volume,
+                            language=language,
+                            mode=mode
+                        )
+                    ))
+
+        return sources
+
+    @staticmethod
+    def _source_key(source: KeywordSource, request: KeywordResearchRequest) -> str:
+        return SnapshotStore.source_key(source.source, source.target, source.location, source.language,
+                                        request.min_search_volume)
+
+    @staticmethod
+    async def _get_snapshot(snapshot_store: SnapshotStore, key: str) -> Optional[Tuple[List[KeywordData], float]]:
+        # Reading and validating a large snapshot is blocking file + JSON work
+        return await asyncio.to_thread(snapshot_store.get_source, key)
+
+    @staticmethod
+    async def _put_snapshot(snapshot_store: SnapshotStore, key: str, keywords: List[KeywordData]):
+        """Writes off the event loop, a failed cache write never fails a research whose upstream calls are paid for"""
+        try:
+            await asyncio.to_thread(snapshot_store.put_source, key, keywords)
+        except Exception as e:
+            print(f"Snapshot write failed for source {key}: {str(e)}")
+
+    @staticmethod
+    async def _bounded(semaphore: asyncio.Semaphore, fetch: Callable[[], Awaitable[List[KeywordData]]]) -> List[KeywordData]:
+        async with semaphore:
+            return await fetch()
+
+    async def _combine(self, sources: List[KeywordSource], source_results: List[List[KeywordData]]) -> List[KeywordData]:
+        """Dedupes within each locale, then merges locales into one keyword set (off the event loop when large)"""
+        locales = [(source.location, source.language) for source in sources]
+        roles = [source.role for source in sources]
+        total = sum(len(result) for result in source_results)
+        return await run_cpu(BaseKeywordService._combine_locales, locales, roles, source_results, size=total, prefer_thread=True)
+
+    @staticmethod
+    def _combine_locales(locales: List[Tuple[str, str]], roles: List[str],
+                         source_results: List[List[KeywordData]]) -> List[KeywordData]:
+        per_locale: Dict[Tuple[str, str], List[KeywordData]] = {}
+        for locale, result in zip(locales, source_results):
+            per_locale.setdefault(locale, []).extend(result)
+
+        # Single market: same output as before fan-out existed
+        if len(per_locale) <= 1:
+            combined = BaseKeywordService._remove_duplicates([kw for result in per_locale.values() for kw in result])
+        else:
+            combined = BaseKeywordService._merge_locales(
+                {locale: BaseKeywordService._remove_duplicates(kws) for locale, kws in per_locale.items()}
+            )
+        return BaseKeywordService._mark_competitor_gaps(combined, locales, roles, source_results)
+
+    @staticmethod
+    def _mark_competitor_gaps(keywords: List[KeywordData], locales: List[Tuple[str, str]], roles: List[str],
+                              source_results: List[List[KeywordData]]) -> List[KeywordData]:
+        """Adds the COMPETITOR_GAP_CONCEPT concept group to keywords the competitor site has and the brand site doesn't"""
+        by_locale: Dict[Tuple[str, str], Dict[str, set]] = {}
+        for locale, role, result in zip(locales, roles, source_results):
+            if role in ("brand", "competitor"):
+                by_locale.setdefault(locale, {}).setdefault(role, set()).update(kw.keyword.lower() for kw in result)
+
+        gaps = set()
+        for sites in by_locale.values():
+            # An empty brand result usually means the lookup failed, not that every competitor keyword is a gap
+            if sites.get("brand") and sites.get("competitor"):
+                gaps |= sites["competitor"] - sites["brand"]
+        if not gaps:
+            return keywords
+
+        return [
+            kw.model_copy(update={"concept_groups": list(kw.concept_groups or []) + [COMPETITOR_GAP_CONCEPT]})
+            if kw.keyword.lower() in gaps else kw
+            for kw in keywords
+        ]
+
+    @staticmethod
+    def _merge_locales(per_locale: Dict[Tuple[str, str], List[KeywordData]]) -> List[KeywordData]:
+        """
+        One KeywordData per keyword text with per-locale volume/CPC in locale_metrics.
+        Top level: volume summed over locations (languages of one location mostly count the same searches,
+        so the highest of them), volume weighted CPC, lowest/highest bid, highest competition
+        """
+        merged: Dict[str, KeywordData] = {}
+        competition_rank = {"low": 0, "medium": 1, "high": 2}
+
+        for (location, language), keywords in per_locale.items():
+            for kw in keywords:
+                metrics = LocaleMetrics(
+                    location=location,
+                    language=language,
+                    search_volume=kw.search_volume,
+                    competition_level=kw.competition_level,
+                    bid_low=kw.bid_low,
+                    bid_high=kw.bid_high,
+                    cpc=kw.cpc
+                )
+                text = kw.keyword.lower()
+                if text not in merged:
+                    merged[text] = kw.model_copy(update={"locale_metrics": [metrics], "concept_groups": list(kw.concept_groups or [])})
+                    continue
+
+                current = merged[text]
+                current.locale_metrics.append(metrics)
+                for group in kw.concept_groups or []:
+                    if group not in current.concept_groups:
+                        current.concept_groups.append(group)
+
+        for kw in merged.values():
+            metrics = kw.locale_metrics
+            per_location: Dict[str, int] = {}
+            for m in metrics:
+                per_location[m.location] = max(per_location.get(m.location, 0), m.search_volume)
+            total_volume = sum(per_location.values())
+            kw.search_volume = total_volume
+            weight = sum(m.search_volume for m in metrics)
+            kw.cpc = (sum(m.cpc * m.search_volume for m in metrics) / weight) if weight else max(m.cpc for m in metrics)
+            kw.bid_low = min(m.bid_low for m in metrics)
+            kw.bid_high = max(m.bid_high for m in metrics)
+            kw.competition_level = max((m.competition_level for m in metrics), key=lambda c: competition_rank[c.value])
+
+        return list(merged.values())
+
+    async def refresh_keywords(self, request: KeywordResearchRequest, snapshot_store: SnapshotStore,
+                               max_snapshot_age: float) -> List[KeywordData]:
+        """
+        Like extract_all_keywords but reuses per-source snapshots younger than max_snapshot_age,
+        only stale or missing sources are fetched again
+        """
+        # Fetched sources must be as fresh as the snapshots they replace, local index answers included
+        sources = self._build_sources(request, max_snapshot_age)
+        source_results: List[List[KeywordData]] = [None] * len(sources)
+        stale = []
+
+        keys = [self._source_key(source, request) for source in sources]
+        snapshots = await asyncio.gather(*[self._get_snapshot(snapshot_store, key) for key in keys])
+        for i, (source, key, snapshot) in enumerate(zip(sources, keys, snapshots)):
+            if snapshot and snapshot[1] <= max_snapshot_age:
+                source_results[i] = snapshot[0]
+                print(f"Source {source.source}:{source.target} ({source.location}/{source.language}) "
+                      f"reused from snapshot ({len(snapshot[0])} keywords)")
+            else:
+                stale.append((i, key, snapshot, source.fetch))
+
+        print(f"Refreshing {len(stale)} of {len(sources)} sources...")
+        semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+        results = await asyncio.gather(*[self._bounded(semaphore, fetch) for _, _, _, fetch in stale],
+                                       return_exceptions=True)
+
+        fresh = []
+        for (i, key, snapshot, _), result in zip(stale, results):
+            # Services return [] on API errors, keep the old snapshot rather than treating everything as dropped
+            if isinstance(result, Exception) or not result:
+                print(f"Source {i+1} refresh failed or empty, using previous snapshot")
+                source_results[i] = snapshot[0] if snapshot else []
+                continue
+            fresh.append(self._put_snapshot(snapshot_store, key, result))
+            source_results[i] = result
+        await asyncio.gather(*fresh)
+
+        unique_keywords = await self._combine(sources, source_results)
+        print(f"Total unique keywords after refresh: {len(unique_keywords)}")
+        return unique_keywords
+
+    async def analyze_overlap(self, request: OverlapRequest, snapshot_store: SnapshotStore, max_snapshot_age: float,
+                              admit: Optional[Callable[[Callable[[], Awaitable]], Awaitable]] = None) -> OverlapResponse:
+        """
+        Brand vs competitor keyword overlap on one market. Site keywords come from snapshots younger than
+        max_snapshot_age when there are some, the comparison runs in the executor (through admit(), when given,
+        so the caller can hold an admission slot for that stage only)
+        """
+        start_time = time.time()
+        websites = list(dict.fromkeys([str(request.brand_website)] + [str(w) for w in request.competitor_websites]))
+        mode = request.api_mode or DATAFORSEO_MODE
+
+        async def fetch(website: str) -> List[KeywordData]:
+            key = SnapshotStore.source_key("site", website, request.location, request.language_name,
+                                           request.min_search_volume)
+            snapshot = await self._get_snapshot(snapshot_store, key)
+            if snapshot and snapshot[1] <= max_snapshot_age:
+                return snapshot[0]
+            keywords = await self.keywords_for_site_service.get_keywords_from_site(
+                website_url=website,
+                location=request.location,
+                min_search_volume=request.min_search_volume,
+                language=request.language_name,
+                mode=mode
+            )
+            if keywords:
+                await self._put_snapshot(snapshot_store, key, keywords)
+                return keywords
+            return snapshot[0] if snapshot else []
+
+        semaphore = asyncio.Semaphore(FANOUT_CONCURRENCY)
+        results = await asyncio.gather(*[self._bounded(semaphore, lambda website=website: fetch(website))
+                                         for website in websites])
+
+        total = sum(len(result) for result in results)
+        # Sketches only save memory: building them is the same pass over every keyword as the exact sets
+        exact = request.method != "estimate"
+        compare = lambda: run_cpu(BaseKeywordService._overlap_stats, results, exact, request.max_candidates,
+                                  size=total, prefer_thread=True)
+        stats = await (admit(compare) if admit else compare())
+        print(f"Overlap of {len(websites)} sites ({total} keywords, {'exact' if exact else 'estimate'}) "
+              f"in {time.time() - start_time:.1f}s")
+
+        competitors = websites[1:]
+        return OverlapResponse(
+            method="exact" if exact else "estimate",
+            brand_website=websites[0],
+            brand_keywords=stats["brand_keywords"],
+            total_gap_keywords=stats["total_gap_keywords"],
+            competitors=[
+                CompetitorOverlap(competitor_website=website, **counts)
+                for website, counts in zip(competitors, stats["competitors"])
+            ],
+            competitor_similarity=[
+                CompetitorSimilarity(competitor_a=competitors[i], competitor_b=competitors[j], jaccard=jaccard)
+                for i, j, jaccard in stats["similarity"]
+            ],
+            competitor_term_candidates=[
+                GapCandidate(keyword=keyword, competitor_count=count, competitor_website=websites[domain_index])
+                for keyword, count, domain_index in stats["candidates"]
+            ],
+            processing_time=round(time.time() - start_time, 4)
+        )
+
+    @staticmethod
+    def _overlap_stats(results: List[List[KeywordData]], exact: bool, max_candidates: int) -> dict:
+        stats = compute_overlap([overlap_rows(result) for result in results], exact, max_candidates)
+
+        # Candidates come back as text, pick the reported KeywordData from the domain with the best volume
+        wanted: Dict[int, Dict[str, int]] = {}
+        for text, count, _, domain_index in stats["candidates"]:
+            wanted.setdefault(domain_index, {})[text] = count
+        found = {}
+        for domain_index, texts in wanted.items():
+            for kw in results[domain_index]:
+                text = kw.keyword.strip().lower()
+                if text in texts and (domain_index, text) not in found:
+                    found[(domain_index, text)] = kw
+
+        stats["candidates"] = [
+            (found[(domain_index, text)], count, domain_index)
+            for text, count, _, domain_index in stats["candidates"] if (domain_index, text) in found
+        ]
+        return stats
+
+    @staticmethod
+    def diff_keywords(previous: List[KeywordData], current: List[KeywordData]) -> KeywordDiff:
+        """New, dropped and volume-changed keywords between two keyword sets"""
+        previous_by_text = {kw.keyword.lower(): kw for kw in previous}
+        current_by_text = {kw.keyword.lower(): kw for kw in current}
+
+        diff = KeywordDiff()
+        for text, kw in current_by_text.items():
+            old = previous_by_text.get(text)
+            if old is None:
+                diff.added.append(kw)
+            elif abs(kw.search_volume - old.search_volume) > VOLUME_CHANGE_THRESHOLD * max(old.search_volume, 1):
+                diff.volume_changed.append(kw)
+
+        diff.dropped = [kw for text, kw in previous_by_text.items() if text not in current_by_text]
+        return diff
+
+    @staticmethod
+    def _remove_duplicates(keywords: List[KeywordData]) -> List[KeywordData]:
+
         seen_keywords = set()
         unique_keywords = []
-        
+
         for keyword in keywords:
             if keyword.keyword.lower() not in seen_keywords:
                 seen_keywords.add(keyword.keyword.lower())
                 unique_keywords.append(keyword)
-        
+
         return unique_keywords
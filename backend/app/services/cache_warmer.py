@@ -0,0 +1,202 @@
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+from app.models.requests import KeywordResearchRequest
+from app.services.admission import AdmissionController, AdmissionRejected
+from app.services.result_store import ResultStore
+from app.config import (
+    CACHE_WARM_ENABLED, CACHE_WARM_CHECK_SECONDS, CACHE_WARM_LEAD_SECONDS, CACHE_WARM_DAILY_UPSTREAM_BUDGET,
+    CACHE_WARM_MIN_SPACING_SECONDS, CACHE_WARM_HALF_LIFE, CACHE_WARM_MIN_SCORE, CACHE_WARM_MAX_TRACKED
+)
+
+logger = logging.getLogger(__name__)
+
+BUDGET_WINDOW_SECONDS = 24 * 3600
+
+# A max_age below two check intervals makes the result due again on every pass, such targets are never warmed
+MIN_WARM_MAX_AGE = 2 * CACHE_WARM_CHECK_SECONDS
+
+
+class TrackedTarget:
+
+    def __init__(self, request: KeywordResearchRequest):
+        self.request = request
+        self.score = 0.0
+        self.last_seen = time.time()
+        self.max_age: Optional[float] = None  # Freshness the clients of this target ask for
+
+    def decayed_score(self, now: float) -> float:
+        return self.score * 0.5 ** ((now - self.last_seen) / CACHE_WARM_HALF_LIFE)
+
+    def lead(self) -> float:
+        """Warm this long before max_age runs out, at most half of max_age so a fresh result is never due"""
+        return min(CACHE_WARM_LEAD_SECONDS, self.max_age / 2)
+
+
+class CacheWarmer:
+
+    # Tracks how often each research is requested and refreshes the hottest stored results
+    # before clients' max_age runs out, in the batch admission lane and within an upstream budget
+    def __init__(self, admission: AdmissionController, result_store: ResultStore,
+                 refresh: Callable[[KeywordResearchRequest, float], Awaitable[object]],
+                 enabled: bool = CACHE_WARM_ENABLED, daily_budget: int = CACHE_WARM_DAILY_UPSTREAM_BUDGET):
+        self.admission = admission
+        self.result_store = result_store
+        self.refresh = refresh  # (request, max_snapshot_age) -> runs the incremental refresh and stores it
+        self.enabled = enabled
+        self.daily_budget = daily_budget
+        self.targets: Dict[str, TrackedTarget] = {}
+        self.warmed: Dict[str, float] = {}  # research_id -> when the stored result was written by the warmer
+        self._spent: deque = deque()  # (time, upstream calls) of warm runs in the budget window
+        self._runner: Optional[asyncio.Task] = None
+        self.counters = {"lookups": 0, "hits": 0, "warm_hits": 0, "warm_runs": 0, "warm_failures": 0,
+                         "skipped_busy": 0, "skipped_budget": 0}
+
+    def record(self, research_id: str, request: KeywordResearchRequest, max_age: Optional[int], hit: Optional[bool]):
+        """Called for every /search: hit is None when the client didn't ask for a stored result"""
+        now = time.time()
+        too_fresh = max_age is not None and max_age < MIN_WARM_MAX_AGE
+        target = self.targets.get(research_id)
+        if target is None and not too_fresh:
+            if len(self.targets) >= CACHE_WARM_MAX_TRACKED:
+                coldest = min(self.targets, key=lambda rid: self.targets[rid].decayed_score(now))
+                self.targets.pop(coldest)
+                self.warmed.pop(coldest, None)
+            target = self.targets[research_id] = TrackedTarget(request)
+
+        if target is not None:
+            target.score = target.decayed_score(now) + 1
+            target.last_seen = now
+            target.request = request
+            if max_age is not None:
+                target.max_age = None if too_fresh else max_age
+
+        if hit is not None:
+            self.counters["lookups"] += 1
+            if hit:
+                self.counters["hits"] += 1
+                if research_id in self.warmed:
+                    self.counters["warm_hits"] += 1
+            else:
+                # A client paid for this one, so the stored result is no longer the warmer's
+                self.warmed.pop(research_id, None)
+
+        if self.enabled:
+            self._ensure_running()
+
+    def _ensure_running(self):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(CACHE_WARM_CHECK_SECONDS)
+            try:
+                await self.warm_due()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Cache warmer pass failed: {str(e)}")
+
+    def due_targets(self) -> List[str]:
+        """Hot targets whose stored result expires for their clients within the lead time, hottest first"""
+        now = time.time()
+        due = []
+        for research_id, target in self.targets.items():
+            score = target.decayed_score(now)
+            if score < CACHE_WARM_MIN_SCORE or target.max_age is None:
+                continue
+            age = self.result_store.age(research_id)
+            if age is None or age >= target.max_age - target.lead():
+                due.append((score, research_id))
+        return [research_id for _, research_id in sorted(due, reverse=True)]
+
+    async def warm_due(self) -> int:
+        """Warms due targets one at a time until the budget runs out or interactive traffic shows up"""
+        warmed = 0
+        for research_id in self.due_targets():
+            target = self.targets.get(research_id)
+            if target is None:
+                continue
+
+            calls = self.upstream_calls(target.request)
+            if self.spent() + calls > self.daily_budget:
+                self.counters["skipped_budget"] += 1
+                break
+            # Only start when nothing is waiting, a queued user request always goes first
+            if not self.admission.is_idle_for("batch"):
+                self.counters["skipped_busy"] += 1
+                break
+
+            if await self._warm(research_id, target, calls):
+                warmed += 1
+            await asyncio.sleep(CACHE_WARM_MIN_SPACING_SECONDS)
+        return warmed
+
+    async def _warm(self, research_id: str, target: TrackedTarget, calls: int) -> bool:
+        self._spent.append((time.time(), calls))
+        start = time.time()
+        written_before = self.result_store.written_at(research_id)
+        try:
+            async with self.admission.slot("batch"):
+                # Sources older than what the clients accept minus the lead time are fetched again
+                await self.refresh(target.request, target.max_age - target.lead())
+        except AdmissionRejected:
+            self.counters["skipped_busy"] += 1
+            return False
+        except Exception as e:
+            self.counters["warm_failures"] += 1
+            logger.error(f"Warming research {research_id} failed: {str(e)}")
+            return False
+
+        # Refresh skips storing fallback results, only count it when a new result was written. Comparing mtimes
+        # with each other, not with time.time(), avoids the filesystem timestamp granularity
+        written = self.result_store.written_at(research_id)
+        if written is None or written == written_before:
+            self.counters["warm_failures"] += 1
+            return False
+
+        self.warmed[research_id] = time.time()
+        self.counters["warm_runs"] += 1
+        logger.info(f"Warmed research {research_id} in {time.time() - start:.1f}s ({calls} upstream calls)")
+        return True
+
+    @staticmethod
+    def upstream_calls(request: KeywordResearchRequest) -> int:
+        """Upper bound of DataForSEO calls for one run, fresh snapshots make the real number lower"""
+        per_locale = 2 + (1 if request.seed_keywords else 0)
+        return per_locale * len(request.get_locations()) * len(request.get_languages())
+
+    def spent(self) -> int:
+        cutoff = time.time() - BUDGET_WINDOW_SECONDS
+        while self._spent and self._spent[0][0] < cutoff:
+            self._spent.popleft()
+        return sum(calls for _, calls in self._spent)
+
+    def stats(self) -> dict:
+        now = time.time()
+        lookups = self.counters["lookups"]
+        hottest = sorted(self.targets.items(), key=lambda item: item[1].decayed_score(now), reverse=True)[:10]
+        return {
+            "enabled": self.enabled,
+            "tracked": len(self.targets),
+            "warmed_entries": len(self.warmed),
+            "hit_ratio": round(self.counters["hits"] / lookups, 3) if lookups else 0.0,
+            "warm_hit_ratio": round(self.counters["warm_hits"] / lookups, 3) if lookups else 0.0,
+            "upstream_spent_24h": self.spent(),
+            "upstream_budget_24h": self.daily_budget,
+            **self.counters,
+            "hottest": [
+                {"research_id": research_id, "score": round(target.decayed_score(now), 2), "max_age": target.max_age,
+                 "warmed": research_id in self.warmed}
+                for research_id, target in hottest
+            ],
+        }
+
+    async def close(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
@@ -0,0 +1,33 @@
+import time
+import logging
+from typing import List, Optional
+from app.config import LLM_RESERVE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class Deadline:
+
+    # Request-level time budget, every stage asks for what is left and records what it had to cut
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.cuts: List[str] = []
+
+    @classmethod
+    def from_request(cls, body_seconds: Optional[float], header_seconds: Optional[float]) -> Optional["Deadline"]:
+        """Tightest of the body field and the header, None when neither is set"""
+        limits = [s for s in (body_seconds, header_seconds) if s is not None and s > 0]
+        return cls(min(limits)) if limits else None
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def extraction_budget(self) -> float:
+        """Upstream keyword calls get what is left after reserving time for the LLM, but at least half"""
+        remaining = self.remaining()
+        return max(remaining - LLM_RESERVE_SECONDS, remaining * 0.5)
+
+    def cut(self, what: str):
+        logger.warning(f"Deadline ({self.seconds:.0f}s, {self.remaining():.1f}s left): {what}")
+        self.cuts.append(what)
@@ -0,0 +1,67 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Callable, Optional
+from app.config import EXECUTOR_MODE, EXECUTOR_WORKERS, OFFLOAD_MIN_ITEMS
+
+logger = logging.getLogger(__name__)
+
+# CPU-bound stages (parsing, dedup, scoring) run here so they don't stall other requests' I/O.
+# In process mode func must be a module-level function (or staticmethod) and args should be plain
+# data (bytes, tuples, lists of primitives) so they are cheap to pickle.
+_mode = EXECUTOR_MODE
+_workers = EXECUTOR_WORKERS
+_min_items = OFFLOAD_MIN_ITEMS
+_executor: Optional[Executor] = None
+_thread_executor: Optional[ThreadPoolExecutor] = None
+
+
+def configure_executor(mode: str = EXECUTOR_MODE, workers: int = EXECUTOR_WORKERS,
+                       min_items: int = OFFLOAD_MIN_ITEMS):
+    """Switch executor settings at runtime (benchmarks), shuts down the current pool"""
+    global _mode, _workers, _min_items
+    if mode not in ("inline", "thread", "process"):
+        raise ValueError(f"Unknown executor mode: {mode}")
+    shutdown_executor()
+    _mode, _workers, _min_items = mode, workers, min_items
+
+
+def executor_mode() -> str:
+    return _mode
+
+
+def get_executor(prefer_thread: bool = False) -> Optional[Executor]:
+    global _executor, _thread_executor
+    if _mode == "inline":
+        return None
+    if prefer_thread and _mode == "process":
+        # Stages working on pydantic objects: pickling them costs more than the work itself
+        if _thread_executor is None:
+            _thread_executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="cpu-stage")
+        return _thread_executor
+    if _executor is None:
+        if _mode == "process":
+            _executor = ProcessPoolExecutor(max_workers=_workers)
+        else:
+            _executor = ThreadPoolExecutor(max_workers=_workers, thread_name_prefix="cpu-stage")
+        logger.info(f"Started {_mode} executor with {_workers} workers")
+    return _executor
+
+
+async def run_cpu(func: Callable[..., Any], *args, size: int, prefer_thread: bool = False) -> Any:
+    """Runs func(*args) off the event loop, inline when size (items in the input) is small"""
+    executor = get_executor(prefer_thread)
+    if executor is None or size < _min_items:
+        return func(*args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, functools.partial(func, *args))
+
+
+def shutdown_executor():
+    global _executor, _thread_executor
+    for executor in (_executor, _thread_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _thread_executor = None
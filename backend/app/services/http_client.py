@@ -0,0 +1,30 @@
+import httpx
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from app.config import HTTP_MAX_CONNECTIONS
+
+# One pooled client for all DataForSEO calls so connections (DNS + TLS) are reused across requests
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=30.0,
+            limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_MAX_CONNECTIONS)
+        )
+    return _client
+
+
+@asynccontextmanager
+async def shared_http_client() -> AsyncIterator[httpx.AsyncClient]:
+    """Drop-in for `async with httpx.AsyncClient()` that yields the pooled client and leaves it open"""
+    yield get_http_client()
+
+
+async def close_http_client():
+    global _client
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
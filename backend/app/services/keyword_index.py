@@ -0,0 +1,302 @@
+import asyncio
+import json
+import re
+import sqlite3
+import threading
+import time
+import logging
+import unicodedata
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, List, Optional
+from app.models.keyword import KeywordData, CompetitionLevel
+from app.config import KEYWORD_INDEX_ENABLED, KEYWORD_INDEX_PATH, KEYWORD_INDEX_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS keyword_stats (
+    term_id INTEGER NOT NULL,
+    location TEXT NOT NULL,
+    language TEXT NOT NULL,
+    keyword TEXT NOT NULL,
+    search_volume INTEGER NOT NULL,
+    competition TEXT NOT NULL,
+    bid_low REAL NOT NULL,
+    bid_high REAL NOT NULL,
+    cpc REAL NOT NULL,
+    concept_groups TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    from_seeds INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (term_id, location, language)
+) WITHOUT ROWID;
+CREATE VIRTUAL TABLE IF NOT EXISTS term_tokens USING fts5(text, content='', tokenize='unicode61');
+CREATE VIRTUAL TABLE IF NOT EXISTS term_tokens_vocab USING fts5vocab(term_tokens, 'row');
+"""
+
+# Created once keyword_stats has from_seeds, index files written before it get the column first
+VOLUME_INDEX = """CREATE INDEX IF NOT EXISTS keyword_stats_volume
+    ON keyword_stats (location, language, search_volume DESC, updated_at, from_seeds, keyword)"""
+
+# Character trigrams need SQLite 3.34+, the index works with tokens only without it
+NGRAM_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS term_ngrams USING fts5(text, content='', tokenize='trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS term_ngrams_vocab USING fts5vocab(term_ngrams, 'row');
+"""
+
+# Rows read from the volume index per fetch while walking it
+WALK_CHUNK = 256
+# A walk that reads this many times its expected rows without filling `limit` falls back to the FTS join
+WALK_BUDGET_FACTOR = 4
+# Cached vocab doc counts are dropped once the index grew by this fraction, or held this many counts
+DOC_COUNT_REFRESH = 0.1
+DOC_COUNT_CACHE_SIZE = 100000
+
+
+def _fold(text: str) -> str:
+    # Case and diacritic folding, close to what the unicode61 tokenizer does
+    if text.isascii():
+        return text.lower()
+    return "".join(c for c in unicodedata.normalize("NFKD", text.lower()) if not unicodedata.combining(c))
+
+
+class KeywordIndex:
+
+    # Every keyword seen upstream, per location/language, searchable by token (inverted index)
+    # and by character trigrams. Keyword text is indexed once in `terms`, so FTS rows never change
+    # and volume/CPC updates only touch keyword_stats.
+    def __init__(self, db_path: str = KEYWORD_INDEX_PATH):
+        if db_path != ":memory:":
+            Path(db_path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(keyword_stats)")]
+        if "from_seeds" not in columns:
+            self.conn.execute("DROP INDEX IF EXISTS keyword_stats_volume")
+            self.conn.execute("ALTER TABLE keyword_stats ADD COLUMN from_seeds INTEGER NOT NULL DEFAULT 0")
+        self.conn.execute(VOLUME_INDEX)
+        try:
+            self.conn.executescript(NGRAM_SCHEMA)
+            self.has_ngrams = True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"Trigram index unavailable, token lookups only: {str(e)}")
+            self.has_ngrams = False
+        self.conn.commit()
+        # (table, vocab term) -> doc count, only steers the plan choice so it may lag behind the index
+        self.doc_counts = {}
+        self.doc_counts_total = 0
+
+    def add(self, keywords: List[KeywordData], location: str, language: str, from_seeds: bool = False) -> int:
+        """
+        Upserts keywords for one location/language, returns how many new terms were indexed.
+        from_seeds marks keywords_for_keywords expansions and sticks once set
+        """
+        now = time.time()
+        location, language = location.strip().lower(), language.strip().lower()
+        new_terms = 0
+
+        with self.lock, self.conn:
+            for kw in keywords:
+                text = kw.keyword.strip().lower()
+                if not text:
+                    continue
+                cursor = self.conn.execute("INSERT OR IGNORE INTO terms (text) VALUES (?)", (text,))
+                if cursor.rowcount:
+                    term_id = cursor.lastrowid
+                    self.conn.execute("INSERT INTO term_tokens (rowid, text) VALUES (?, ?)", (term_id, text))
+                    if self.has_ngrams:
+                        self.conn.execute("INSERT INTO term_ngrams (rowid, text) VALUES (?, ?)", (term_id, text))
+                    new_terms += 1
+                else:
+                    term_id = self.conn.execute("SELECT id FROM terms WHERE text = ?", (text,)).fetchone()[0]
+
+                self.conn.execute(
+                    """INSERT INTO keyword_stats (term_id, location, language, keyword, search_volume, competition,
+                                                  bid_low, bid_high, cpc, concept_groups, updated_at, from_seeds)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (term_id, location, language) DO UPDATE SET
+                           keyword = excluded.keyword, search_volume = excluded.search_volume,
+                           competition = excluded.competition, bid_low = excluded.bid_low,
+                           bid_high = excluded.bid_high, cpc = excluded.cpc,
+                           concept_groups = excluded.concept_groups, updated_at = excluded.updated_at,
+                           from_seeds = MAX(from_seeds, excluded.from_seeds)""",
+                    (term_id, location, language, kw.keyword, kw.search_volume, kw.competition_level.value,
+                     kw.bid_low, kw.bid_high, kw.cpc, json.dumps(kw.concept_groups or []), now, int(from_seeds))
+                )
+
+        return new_terms
+
+    def lookup(self, seeds: List[str], location: str, language: str, min_search_volume: int = 0,
+               max_age: Optional[float] = KEYWORD_INDEX_MAX_AGE, limit: int = 1000,
+               from_seeds: bool = False) -> List[List[KeywordData]]:
+        """
+        Related keywords per seed, highest volume first: keywords containing every seed token,
+        plus keywords containing the seed tokens as substrings (plurals, compounds) via trigrams.
+        from_seeds keeps only keywords that came from keywords_for_keywords expansions
+        """
+        location, language = location.strip().lower(), language.strip().lower()
+        min_updated = time.time() - max_age if max_age else 0.0
+        # location, language, min volume, min updated_at, min from_seeds: the WHERE parameters of every plan
+        filters = (location, language, min_search_volume, min_updated, int(from_seeds))
+        results = []
+
+        with self.lock:
+            for seed in seeds:
+                tokens = TOKEN_PATTERN.findall(seed.lower())
+                if not tokens:
+                    results.append([])
+                    continue
+
+                # Each query returns its own top `limit` by volume, so the merged top `limit` is exact
+                folded = [_fold(t) for t in tokens]
+                rows = self._search("term_tokens", tokens, [[t] for t in folded],
+                                    lambda keyword: set(folded).issubset(TOKEN_PATTERN.findall(_fold(keyword))),
+                                    filters, limit)
+
+                # Substring matches only when whole-token matches don't fill the result already
+                ngram_tokens = [t for t in tokens if len(t) >= 3]
+                if self.has_ngrams and ngram_tokens and len(rows) < limit:
+                    rows += self._search("term_ngrams", ngram_tokens,
+                                         [[t[i:i + 3] for i in range(len(t) - 2)] for t in ngram_tokens],
+                                         lambda keyword: all(t in keyword.lower() for t in ngram_tokens),
+                                         filters, limit)
+
+                unique = {row[0].lower(): row for row in rows}
+                ranked = sorted(unique.values(), key=lambda row: row[1], reverse=True)[:limit]
+                results.append([self._to_keyword(row) for row in ranked])
+
+        return results
+
+    def _search(self, table: str, tokens: List[str], vocab_terms: List[List[str]], matches: Callable[[str], bool],
+                filters: tuple, limit: int) -> list:
+        """
+        Top `limit` keywords matching every token, planned per token frequency: common tokens walk
+        keyword_stats by volume and stop after `limit` matches, rare tokens join from the FTS postings
+        """
+        total = self.conn.execute("SELECT MAX(id) FROM terms").fetchone()[0] or 0
+        estimate = self._estimate_matches(table, vocab_terms, total)
+
+        # The walk reads about limit * total / estimate rows, the join looks up every matching term
+        walk_rows = limit * total / estimate if estimate else float("inf")
+        if walk_rows < estimate:
+            rows = self._walk(matches, filters, limit, budget=int(walk_rows * WALK_BUDGET_FACTOR) + WALK_CHUNK)
+            if rows is not None:
+                return rows
+        return self._query(table, " AND ".join(f'"{t}"' for t in tokens), filters, limit)
+
+    def _estimate_matches(self, table: str, vocab_terms: List[List[str]], total: int) -> float:
+        # A token matches at most as many terms as its rarest vocab entry (itself, or its rarest trigram),
+        # several tokens are assumed independent
+        if not total:
+            return 0.0
+        if total > self.doc_counts_total * (1 + DOC_COUNT_REFRESH) or len(self.doc_counts) > DOC_COUNT_CACHE_SIZE:
+            self.doc_counts, self.doc_counts_total = {}, total
+        estimate = float(total)
+        for terms in vocab_terms:
+            docs = min(self._doc_count(table, term) for term in terms)
+            estimate *= docs / total
+        return estimate
+
+    def _doc_count(self, table: str, term: str) -> int:
+        # fts5vocab counts by reading the term's posting list, milliseconds for common terms
+        if (table, term) not in self.doc_counts:
+            row = self.conn.execute(f"SELECT doc FROM {table}_vocab WHERE term = ?", (term,)).fetchone()
+            self.doc_counts[(table, term)] = row[0] if row else 0
+        return self.doc_counts[(table, term)]
+
+    def _walk(self, matches: Callable[[str], bool], filters: tuple, limit: int, budget: int) -> Optional[list]:
+        """Walks the covering volume index highest volume first, None once `budget` rows didn't fill `limit`"""
+        cursor = self.conn.execute(
+            """SELECT term_id, keyword FROM keyword_stats INDEXED BY keyword_stats_volume
+               WHERE location = ? AND language = ? AND search_volume >= ? AND updated_at >= ? AND from_seeds >= ?
+               ORDER BY search_volume DESC""",
+            filters
+        )
+        term_ids, scanned = [], 0
+        try:
+            while len(term_ids) < limit:
+                chunk = cursor.fetchmany(WALK_CHUNK)
+                if not chunk:
+                    break
+                scanned += len(chunk)
+                term_ids += [term_id for term_id, keyword in chunk if matches(keyword)]
+                if len(term_ids) < limit and scanned >= budget:
+                    return None
+        finally:
+            cursor.close()
+
+        return [
+            self.conn.execute(
+                """SELECT keyword, search_volume, competition, bid_low, bid_high, cpc, concept_groups
+                   FROM keyword_stats WHERE term_id = ? AND location = ? AND language = ?""",
+                (term_id, filters[0], filters[1])
+            ).fetchone()
+            for term_id in term_ids[:limit]
+        ]
+
+    def _query(self, table: str, match: str, filters: tuple, limit: int) -> list:
+        # CROSS JOIN keeps the FTS match as the outer loop (primary key lookup per matched term, then a top-N sort)
+        return self.conn.execute(
+            f"""SELECT s.keyword, s.search_volume, s.competition, s.bid_low, s.bid_high, s.cpc, s.concept_groups
+                FROM {table} f CROSS JOIN keyword_stats s ON s.term_id = f.rowid
+                WHERE {table} MATCH ? AND s.location = ? AND s.language = ?
+                  AND s.search_volume >= ? AND s.updated_at >= ? AND s.from_seeds >= ?
+                ORDER BY s.search_volume DESC
+                LIMIT ?""",
+            (match, *filters, limit)
+        ).fetchall()
+
+    @staticmethod
+    def _to_keyword(row) -> KeywordData:
+        keyword, search_volume, competition, bid_low, bid_high, cpc, concept_groups = row
+        return KeywordData.model_construct(
+            keyword=keyword,
+            search_volume=search_volume,
+            competition_level=CompetitionLevel(competition),
+            bid_low=bid_low,
+            bid_high=bid_high,
+            cpc=cpc,
+            concept_groups=json.loads(concept_groups),
+            locale_metrics=[]
+        )
+
+    def stats(self) -> dict:
+        with self.lock:
+            terms = self.conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+            rows = self.conn.execute("SELECT COUNT(*) FROM keyword_stats").fetchone()[0]
+        return {"terms": terms, "keyword_rows": rows, "ngrams": self.has_ngrams}
+
+    # SQLite calls block, the async wrappers keep them off the event loop
+    async def add_async(self, keywords: List[KeywordData], location: str, language: str, from_seeds: bool = False) -> int:
+        return await asyncio.to_thread(self.add, keywords, location, language, from_seeds)
+
+    async def lookup_async(self, seeds: List[str], location: str, language: str, min_search_volume: int = 0,
+                           max_age: Optional[float] = KEYWORD_INDEX_MAX_AGE, limit: int = 1000,
+                           from_seeds: bool = False) -> List[List[KeywordData]]:
+        return await asyncio.to_thread(self.lookup, seeds, location, language, min_search_volume, max_age, limit,
+                                       from_seeds)
+
+
+@lru_cache(maxsize=None)
+def get_keyword_index() -> KeywordIndex:
+    return KeywordIndex()
+
+
+async def record_keywords(keywords: List[KeywordData], location: str, language: str, from_seeds: bool = False):
+    """Adds upstream results to the index, never fails the request that fetched them"""
+    if not KEYWORD_INDEX_ENABLED or not keywords:
+        return
+    try:
+        new_terms = await get_keyword_index().add_async(keywords, location, language, from_seeds)
+        logger.info(f"Indexed {len(keywords)} keywords ({new_terms} new) for {location}/{language}")
+    except Exception as e:
+        logger.error(f"Keyword index update failed: {str(e)}")
@@ -0,0 +1,107 @@
+import asyncio
+import json
+from typing import List, Dict, Any, Tuple
+from app.models.keyword import KeywordData, CompetitionLevel
+from app.services.executor import run_cpu, executor_mode
+
+# Compact row passed back from worker processes:
+# (keyword, search_volume, competition, bid_low, bid_high, cpc, concept_groups)
+KeywordRow = Tuple[str, int, str, float, float, float, List[str]]
+
+# Models built per event loop turn when rebuilding rows returned from a worker process
+ROWS_PER_CHUNK = 250
+
+# Rough size of one keyword row in a raw DataForSEO response, used to estimate rows from bytes
+BYTES_PER_ROW = 500
+
+
+async def parse_keywords_off_loop(content: bytes, min_search_volume: int) -> List[KeywordData]:
+    """Parses a raw DataForSEO response in the executor (inline for small responses)"""
+    size = len(content) // BYTES_PER_ROW
+    if executor_mode() == "process":
+        # Only compact tuples cross the process boundary, models are built back here in chunks
+        # so other requests get the event loop in between
+        rows = await run_cpu(parse_keyword_response, content, min_search_volume, size=size)
+        keywords = []
+        for start in range(0, len(rows), ROWS_PER_CHUNK):
+            keywords.extend(rows_to_keywords(rows[start:start + ROWS_PER_CHUNK]))
+            await asyncio.sleep(0)
+        return keywords
+    return await run_cpu(parse_keywords, content, min_search_volume, size=size)
+
+
+def parse_keywords(content: bytes, min_search_volume: int) -> List[KeywordData]:
+    return rows_to_keywords(parse_keyword_response(content, min_search_volume))
+
+
+def parse_keyword_response(content: bytes, min_search_volume: int) -> List[KeywordRow]:
+    """Raw DataForSEO response body -> compact keyword rows (runs in the executor)"""
+    return extract_keyword_rows(json.loads(content), min_search_volume)
+
+
+def extract_keyword_rows(raw_data: Dict[str, Any], min_search_volume: int) -> List[KeywordRow]:
+    rows = []
+
+    # Navigate the response structure: tasks[0].result[]
+    tasks = raw_data.get("tasks", [])
+    if not tasks:
+        return rows
+
+    result_list = tasks[0].get("result") or []
+
+    for item in result_list:
+        try:
+            keyword_text = item.get("keyword", "").strip()
+            search_volume = int(item.get("search_volume", 0))
+            # Filter out low volume
+            if search_volume < min_search_volume:
+                continue
+
+            competition = item.get("competition", "MEDIUM").upper()
+            bid_low = float(item.get("low_top_of_page_bid", 0.0))
+            bid_high = float(item.get("high_top_of_page_bid", 0.0))
+            cpc = float(item.get("cpc", 0.0))
+
+            # Extract concept groups for LLM context
+            concept_groups = []
+            if "keyword_annotations" in item:
+                concepts = item["keyword_annotations"].get("concepts", [])
+                for concept in concepts:
+                    group_name = concept.get("concept_group", {}).get("name")
+                    if group_name:
+                        concept_groups.append(group_name)
+
+            # Convert competition to correct format
+            if competition == "HIGH":
+                comp_level = CompetitionLevel.HIGH.value
+            elif competition == "LOW":
+                comp_level = CompetitionLevel.LOW.value
+            else:
+                comp_level = CompetitionLevel.MEDIUM.value
+
+            # Only add valid keywords
+            if keyword_text:
+                rows.append((keyword_text, search_volume, comp_level, bid_low, bid_high, cpc, concept_groups))
+
+        except (ValueError, KeyError, TypeError, AttributeError):
+            # Skip invalid keyword data
+            continue
+
+    return rows
+
+
+def rows_to_keywords(rows: List[KeywordRow]) -> List[KeywordData]:
+    """Rows were validated while parsing, so skip pydantic validation here"""
+    return [
+        KeywordData.model_construct(
+            keyword=keyword,
+            search_volume=search_volume,
+            competition_level=CompetitionLevel(competition),
+            bid_low=bid_low,
+            bid_high=bid_high,
+            cpc=cpc,
+            concept_groups=concept_groups,
+            locale_metrics=[]
+        )
+        for keyword, search_volume, competition, bid_low, bid_high, cpc, concept_groups in rows
+    ]
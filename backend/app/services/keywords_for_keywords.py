@@ -1,159 +1,91 @@
-import httpx
-from typing import List, Dict, Any
-from app.models.keyword import KeywordData, CompetitionLevel
-from app.config import KEYWORDS_FOR_KEYWORDS_API_AUTH
+from typing import List, Dict, Any, Optional
+from app.models.keyword import KeywordData
+from app.services.keyword_parsing import parse_keywords_off_loop, extract_keyword_rows, rows_to_keywords
+from app.services.http_client import shared_http_client
+from app.services.task_scheduler import get_task_scheduler
+from app.services.keyword_index import get_keyword_index, record_keywords
+from app.config import KEYWORDS_FOR_KEYWORDS_API_AUTH, KEYWORD_INDEX_ENABLED, KEYWORD_INDEX_MIN_PER_SEED, KEYWORD_INDEX_MAX_AGE
 
 class KeywordsForKeywordsService:
     
     # Factory pattern used for simplicity and not dependency injection
     def __init__(self):
         self.api_auth = KEYWORDS_FOR_KEYWORDS_API_AUTH
-        self.base_url = "https://api.dataforseo.com/v3/keywords_data/google_ads/keywords_for_keywords/live"
+        self.endpoint = "https://api.dataforseo.com/v3/keywords_data/google_ads/keywords_for_keywords"
+        self.base_url = f"{self.endpoint}/live"
         self.headers = {
             "Authorization": f"Basic {self.api_auth}",
             "Content-Type": "application/json"
         }
     
     async def get_keywords_from_seeds(self, keywords: List[str], location: str, 
-                                      min_search_volume: int ) -> List[KeywordData]:
+                                      min_search_volume: int, language: str = "English", mode: str = "live",
+                                      max_age: Optional[float] = None) -> List[KeywordData]:
 
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        # Answer from keywords we already paid for when the local index covers every seed well enough,
+        # max_age (seconds) tightens KEYWORD_INDEX_MAX_AGE for callers that need fresher data
+        local_keywords = await self._lookup_local(keywords, location, language, min_search_volume, max_age)
+        if local_keywords is not None:
+            return local_keywords
+
+        async with shared_http_client() as client:
             try:
                 payload = [{
                     "location_name": location,
-                    "language_name": "English", 
+                    "language_name": language,
                     "keywords": keywords  # List of seed keywords
                 }]
                 
-                response = await client.post(
-                    self.base_url,
-                    headers=self.headers,
-                    json=payload
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"API error: {response.status_code} - {response.text}")
-                
-                keywords = []
-                raw_data = response.json()
-        
-                # Navigate the response structure: tasks[0].result[]
-                tasks = raw_data.get("tasks", [])
-                if not tasks:
-                    return keywords
-                    
-                result_list = tasks[0].get("result", [])
-                
-                for item in result_list:
-                    try:
-                        keyword_text = item.get("keyword", "").strip()
-                        search_volume = int(item.get("search_volume", 0))
-                        # Filter out low volume
-                        if search_volume < min_search_volume:
-                            continue
-
-                        competition = item.get("competition", "MEDIUM").upper()
-                        bid_low = float(item.get("low_top_of_page_bid", 0.0))
-                        bid_high = float(item.get("high_top_of_page_bid", 0.0))
-                        cpc = float(item.get("cpc", 0.0))
-
-                        # Extract concept groups for LLM context
-                        concept_groups = []
-                        if "keyword_annotations" in item:
-                            concepts = item["keyword_annotations"].get("concepts", [])
-                            for concept in concepts:
-                                group_name = concept.get("concept_group", {}).get("name")
-                                if group_name:
-                                    concept_groups.append(group_name)
-                        
-                        # Convert competition to correct format
-                        if competition == "HIGH":
-                            comp_level = CompetitionLevel.HIGH
-                        elif competition == "LOW":
-                            comp_level = CompetitionLevel.LOW
-                        else:
-                            comp_level = CompetitionLevel.MEDIUM
-                        
-                        # Only add valid keywords
-                        if keyword_text:
-                            keywords.append(KeywordData(
-                                keyword=keyword_text,
-                                search_volume=search_volume,
-                                competition_level=comp_level,
-                                bid_low=bid_low,
-                                bid_high=bid_high,
-                                cpc=cpc,
-                                concept_groups=concept_groups
-                            ))
-                            
-                    except (ValueError, KeyError, TypeError) as e:
-                        # Skip invalid keyword data
-                        continue
-
+                if mode == "standard":
+                    # Queued task_post / task_get: slower but cheaper, the body has the same shape as /live
+                    content = await get_task_scheduler().run(self.endpoint, payload[0], self.headers)
+                else:
+                    response = await client.post(
+                        self.base_url,
+                        headers=self.headers,
+                        json=payload
+                    )
 
-                return keywords
+                    if response.status_code != 200:
+                        raise Exception(f"API error: {response.status_code} - {response.text}")
+                    content = response.content
+                
+                # Parsing thousands of rows is CPU work, keep it off the event loop for large responses
+                # Everything is parsed and indexed, the volume filter applies to what this request gets back
+                all_keywords = await parse_keywords_off_loop(content, 0)
+                await record_keywords(all_keywords, location, language, from_seeds=True)
+                return [kw for kw in all_keywords if kw.search_volume >= min_search_volume]
                 
             except Exception as e:
                 print(f"Error expanding keywords {keywords}: {str(e)}")
                 return []
     
-    def format_response(self, raw_data: Dict[str, Any], min_search_volume: int) -> List[KeywordData]:
-    
-        keywords = []
-        
-        # Navigate the response structure: tasks[0].result[]
-        tasks = raw_data.get("tasks", [])
-        if not tasks:
-            return keywords
-            
-        result_list = tasks[0].get("result", [])
-        
-        for item in result_list:
-            try:
-                # Extract core keyword data
-                keyword_text = item.get("keyword", "").strip()
-                search_volume = int(item.get("search_volume", 0))
-                
-                # Filter out low volume
-                if search_volume < min_search_volume:
-                    continue
+    async def _lookup_local(self, keywords: List[str], location: str, language: str,
+                            min_search_volume: int, max_age: Optional[float] = None) -> Optional[List[KeywordData]]:
+        if not KEYWORD_INDEX_ENABLED or (max_age is not None and max_age <= 0):
+            return None
+        if max_age is None or (KEYWORD_INDEX_MAX_AGE and KEYWORD_INDEX_MAX_AGE < max_age):
+            max_age = KEYWORD_INDEX_MAX_AGE
+        try:
+            # Only earlier seed expansions count: site keywords that happen to contain a seed token
+            # are not what keywords_for_keywords would return for it
+            per_seed = await get_keyword_index().lookup_async(keywords, location, language, min_search_volume,
+                                                              max_age, from_seeds=True)
+        except Exception as e:
+            print(f"Local keyword index lookup failed: {str(e)}")
+            return None
 
-                competition = item.get("competition", "MEDIUM").upper()
-                bid_low = float(item.get("low_top_of_page_bid", 0.0))
-                bid_high = float(item.get("high_top_of_page_bid", 0.0))
-                cpc = float(item.get("cpc", 0.0))
+        thinnest = min((len(found) for found in per_seed), default=0)
+        if thinnest < KEYWORD_INDEX_MIN_PER_SEED:
+            print(f"Local index too thin for {keywords} ({thinnest} < {KEYWORD_INDEX_MIN_PER_SEED} per seed), calling API")
+            return None
 
-                # Extract concept groups for LLM context
-                concept_groups = []
-                if "keyword_annotations" in item:
-                    concepts = item["keyword_annotations"].get("concepts", [])
-                    for concept in concepts:
-                        group_name = concept.get("concept_group", {}).get("name")
-                        if group_name:
-                            concept_groups.append(group_name)
-                
-                # Convert competition to our enum format
-                if competition == "HIGH":
-                    comp_level = CompetitionLevel.HIGH
-                elif competition == "LOW":
-                    comp_level = CompetitionLevel.LOW
-                else:
-                    comp_level = CompetitionLevel.MEDIUM
-                
-                # Only add valid keywords
-                if keyword_text :
-                    keywords.append(KeywordData(
-                        keyword=keyword_text,
-                        search_volume=search_volume,
-                        competition_level=comp_level,
-                        bid_low=bid_low,
-                        bid_high=bid_high,
-                        cpc=cpc,
-                        concept_groups=concept_groups
-                    ))
-                    
-            except (ValueError, KeyError, TypeError) as e:
-                # Skip invalid keyword data
-                continue
-        
-        return keywords
+        merged = {}
+        for found in per_seed:
+            for kw in found:
+                merged.setdefault(kw.keyword.lower(), kw)
+        print(f"Answered {keywords} from local index: {len(merged)} keywords")
+        return list(merged.values())
+
+    def format_response(self, raw_data: Dict[str, Any], min_search_volume: int) -> List[KeywordData]:
+        return rows_to_keywords(extract_keyword_rows(raw_data, min_search_volume))
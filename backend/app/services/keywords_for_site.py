@@ -1,6 +1,9 @@
-import httpx
 from typing import List, Dict, Any
-from app.models.keyword import KeywordData, CompetitionLevel
+from app.models.keyword import KeywordData
+from app.services.keyword_parsing import parse_keywords_off_loop
+from app.services.http_client import shared_http_client
+from app.services.task_scheduler import get_task_scheduler
+from app.services.keyword_index import record_keywords
 from app.config import KEYWORDS_FOR_SITE_API_AUTH
 
 class KeywordsForSiteService:
@@ -8,90 +11,43 @@ class KeywordsForSiteService:
     # Factory pattern used for simplicity and not dependency injection
     def __init__(self):
         self.api_auth = KEYWORDS_FOR_SITE_API_AUTH
-        self.base_url = "https://api.dataforseo.com/v3/keywords_data/google_ads/keywords_for_site/live"
+        self.endpoint = "https://api.dataforseo.com/v3/keywords_data/google_ads/keywords_for_site"
+        self.base_url = f"{self.endpoint}/live"
         self.headers = {
             "Authorization": f"Basic {self.api_auth}",
             "Content-Type": "application/json"
         }
     
     async def get_keywords_from_site(self, website_url: str, location: str,
-                                      min_search_volume: int ) -> List[KeywordData]:
+                                      min_search_volume: int, language: str = "English", mode: str = "live") -> List[KeywordData]:
         """Extract keywords from website URL"""
-        async with httpx.AsyncClient(timeout=30.0) as client:
+        async with shared_http_client() as client:
             try:
                 payload = [{
                     "target": website_url,
-                    "language_name": "English",
+                    "language_name": language,
                     "location_name": location  # Dynamic location from user dropdown
                 }]
                 
-                response = await client.post(
-                    f"{self.base_url}",
-                    headers=self.headers,
-                    json=payload
-                )
-                
-                if response.status_code != 200:
-                    raise Exception(f"API error: {response.status_code} - {response.text}")
-                
-                keywords = []
-                raw_data = response.json()
-        
-                # Navigate the response structure: tasks[0].result[]
-                tasks = raw_data.get("tasks", [])
-                if not tasks:
-                    return keywords
-                    
-                result_list = tasks[0].get("result", [])
-                
-                for item in result_list:
-                    try:
-                        keyword_text = item.get("keyword", "").strip()
-                        search_volume = int(item.get("search_volume", 0))
-                        # Filter out low volume
-                        if search_volume < min_search_volume:
-                            continue
+                if mode == "standard":
+                    # Queued task_post / task_get: slower but cheaper, the body has the same shape as /live
+                    content = await get_task_scheduler().run(self.endpoint, payload[0], self.headers)
+                else:
+                    response = await client.post(
+                        f"{self.base_url}",
+                        headers=self.headers,
+                        json=payload
+                    )
 
-                        competition = item.get("competition", "MEDIUM").upper()
-                        bid_low = float(item.get("low_top_of_page_bid", 0.0))
-                        bid_high = float(item.get("high_top_of_page_bid", 0.0))
-                        cpc = float(item.get("cpc", 0.0))
-
-                        # Extract concept groups for LLM context
-                        concept_groups = []
-                        if "keyword_annotations" in item:
-                            concepts = item["keyword_annotations"].get("concepts", [])
-                            for concept in concepts:
-                                group_name = concept.get("concept_group", {}).get("name")
-                                if group_name:
-                                    concept_groups.append(group_name)
-                        
-                        # Convert competition to correct format
-                        if competition == "HIGH":
-                            comp_level = CompetitionLevel.HIGH
-                        elif competition == "LOW":
-                            comp_level = CompetitionLevel.LOW
-                        else:
-                            comp_level = CompetitionLevel.MEDIUM
-                        
-                        # Only add valid keywords
-                        if keyword_text:
-                            keywords.append(KeywordData(
-                                keyword=keyword_text,
-                                search_volume=search_volume,
-                                competition_level=comp_level,
-                                bid_low=bid_low,
-                                bid_high=bid_high,
-                                cpc=cpc,
-                                concept_groups=concept_groups
-                            ))
-                            
-                    except (ValueError, KeyError, TypeError) as e:
-                        # Skip invalid keyword data
-                        continue
-
-
-                return keywords
+                    if response.status_code != 200:
+                        raise Exception(f"API error: {response.status_code} - {response.text}")
+                    content = response.content
+                
+                # Parsing thousands of rows is CPU work, keep it off the event loop for large responses
+                # Everything is parsed and indexed, the volume filter applies to what this request gets back
+                all_keywords = await parse_keywords_off_loop(content, 0)
+                await record_keywords(all_keywords, location, language)
+                return [kw for kw in all_keywords if kw.search_volume >= min_search_volume]
             
                 
             except Exception as e:
@@ -1,31 +1,92 @@
-import openai
+import asyncio
 import json
 import time
 import logging
-from typing import List
-from app.models.keyword import KeywordData, CompetitionLevel
+from functools import partial
+from typing import List, NamedTuple, Tuple, Optional, Dict
+from urllib.parse import urlparse
+from app.models.keyword import KeywordData, CompetitionLevel, KeywordDiff
 from app.models.requests import KeywordResearchRequest
 from app.models.ad_groups import SimplifiedDeliverable, SimpleAdGroup, SimpleKeyword
-from app.config import OPENAI_API_KEY
+from app.config import OPENAI_API_KEY, LLM_MIN_SECONDS, LLM_SHORTEN_BELOW_SECONDS
+from app.services.deadline import Deadline
+from app.services.executor import run_cpu
+from app.services.overlap import COMPETITOR_GAP_CONCEPT
+from app.services.model_ladder import ModelLadder, ModelStats, parse_ladder
 
 # logging setup 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Local grouping (used when the deadline leaves no time for the LLM): group type -> (name, budget share)
+LOCAL_GROUPS = {
+    "brand": ("Brand Terms", 40),
+    "category": ("Category Terms", 30),
+    "competitor": ("Competitor Terms", 10),
+    "location": ("Location-based Queries", 10),
+    "long_tail": ("Long-Tail Informational Queries", 10),
+}
+
+# Marks deliverables that came from the rule-based grouping instead of a model
+LOCAL_GROUPING = "local_rules"
+
+# Output validation: share of returned keywords that must come from the prompt, share of prompt keywords placed
+MIN_KNOWN_KEYWORD_SHARE = 0.8
+MIN_PLACED_KEYWORD_SHARE = 0.5
+
+# Competitor gap keywords added to the prompt / local grouping on top of the priority keywords
+GAP_CANDIDATES = 5
+
+
+class GroupingUpdate(NamedTuple):
+    deliverable: SimplifiedDeliverable
+    unplaced: List[KeywordData]  # New keywords that are in no group yet, left out of the baseline so the next diff offers them again
+    placement_failed: bool
+
 
 class LLMService:
     def __init__(self):
-        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        self._client = None
+        self.model_stats = ModelStats()
+        self.ladder = ModelLadder(parse_ladder(), self.model_stats)
+
+    @property
+    def client(self):
+        # openai takes a while to import, so it is loaded on first use (or by the startup warm-up)
+        if self._client is None:
+            import openai
+            self._client = openai.OpenAI(api_key=OPENAI_API_KEY)
+        return self._client
+
+    async def warm_up(self):
+        """Opens the OpenAI connection ahead of the first real call (cheap authenticated GET)"""
+        await asyncio.to_thread(self.client.models.list)
     
-    async def create_ad_groups(self, keywords: List[KeywordData], request: KeywordResearchRequest) -> SimplifiedDeliverable:
-        """LLM call to group keywords into ad groups"""
+    async def create_ad_groups(self, keywords: List[KeywordData], request: KeywordResearchRequest,
+                               deadline: Optional[Deadline] = None) -> SimplifiedDeliverable:
+        """LLM call to group keywords into ad groups
+
+        Models are tried along the ladder until one gives a valid answer, when none does -> local grouping.
+        With a deadline: too little time left -> local rule-based grouping instead of the LLM,
+        tight -> fewer keywords and tokens, LLM timeout -> local grouping
+        """
         start_time = time.time()
+        top_n, max_tokens, gap_n = 20, None, GAP_CANDIDATES
+
+        if deadline is not None:
+            if deadline.remaining() < LLM_MIN_SECONDS:
+                deadline.cut("llm_skipped:local_grouping")
+                return await self._create_local_groups(keywords, request, start_time)
+            if deadline.remaining() < LLM_SHORTEN_BELOW_SECONDS:
+                deadline.cut("llm_shortened")
+                top_n, max_tokens, gap_n = 10, 2000, 2
         
         try:
             logger.info(f"Starting LLM with {len(keywords)} keywords")
 
             #Create top_n priority keywords
-            priority_keywords = self._create_priority_keywords(keywords, 20)
+            priority_keywords = await self._create_priority_keywords(keywords, top_n)
+            priority_keywords = self._with_gap_candidates(priority_keywords, keywords, gap_n)
             logger.info("Priority keywords extracted created successfully")
 
             # Build simple prompt
@@ -33,62 +94,245 @@ class LLMService:
             prompt = self._create_prompt(priority_keywords, request.search_ads_budget)
             logger.info("Prompt created successfully")
             
-            # Call OpenAI
-            response = await self._call_llm(prompt)
-            logger.info("OpenAI call successful")
-            
-            # Parse response
-            result = self._parse_json(response, request.search_ads_budget, len(keywords))
+            # Call OpenAI along the model ladder, an answer only counts once it parses and passes validation
+            timeout = deadline.remaining() if deadline else None
+            result, model = await self.ladder.run(
+                partial(self._call_llm, prompt),
+                lambda response: self._validated_deliverable(response, priority_keywords, request.search_ads_budget,
+                                                             len(keywords)),
+                timeout=timeout,
+                max_tokens_cap=max_tokens
+            )
+            logger.info(f"OpenAI call successful ({model})")
+            result.generated_by = model
             result.processing_time = time.time() - start_time
 
             logger.info(f"LLM service completed successfully in {result.processing_time:.1f}s")
             
             return result
         
+        except asyncio.TimeoutError:
+            if deadline is not None:
+                deadline.cut("llm_timed_out:local_grouping")
+            return await self._create_local_groups(keywords, request, start_time)
         except Exception as e:
-            logger.error(f"LLM failed: {str(e)}")
-            return self._create_fallback(request.search_ads_budget, len(keywords))
-    
-    def _create_priority_keywords(self, keywords: List[KeywordData], top_n: int) -> List[KeywordData]:
+            # Every model failed or gave invalid output: rule-based groups beat an empty "Parsing Failed" group
+            logger.error(f"LLM failed, using local grouping: {str(e)}")
+            if deadline is not None:
+                deadline.cut("llm_failed:local_grouping")
+            return await self._create_local_groups(keywords, request, start_time)
+
+    async def _create_local_groups(self, keywords: List[KeywordData], request: KeywordResearchRequest,
+                                   start_time: float) -> SimplifiedDeliverable:
+        """Rule-based grouping with the same classification rules the prompt gives the LLM"""
+        budget = request.search_ads_budget
+        priority_keywords = await self._create_priority_keywords(keywords, 20)
+        priority_keywords = self._with_gap_candidates(priority_keywords, keywords, GAP_CANDIDATES)
+        brand_token = self._domain_token(str(request.brand_website))
+        competitor_token = self._domain_token(str(request.competitor_website))
+
+        grouped = {group_type: [] for group_type in LOCAL_GROUPS}
+        for kw in priority_keywords:
+            text = kw.keyword.lower()
+            concepts = set(kw.concept_groups or [])
+            if "Brand Names" in concepts or (brand_token and brand_token in text):
+                group_type = "brand"
+            elif ("Competitors" in concepts or COMPETITOR_GAP_CONCEPT in concepts
+                  or (competitor_token and competitor_token in text)):
+                group_type = "competitor"
+            elif "Geography" in concepts:
+                group_type = "location"
+            elif len(text.split()) >= 4:
+                group_type = "long_tail"
+            else:
+                group_type = "category"
+            grouped[group_type].append(SimpleKeyword(
+                keyword=kw.keyword,
+                search_volume=kw.search_volume,
+                competition_level=kw.competition_level.value,
+                cpc_low=kw.bid_low,
+                cpc_high=kw.bid_high,
+                suggested_match_types=["exact", "phrase"] if group_type in ("brand", "competitor") else ["phrase", "broad"]
+            ))
+
+        # Fixed shares (brand highest, like the prompt asks), renormalized over non-empty groups
+        used_share = sum(LOCAL_GROUPS[group_type][1] for group_type, kws in grouped.items() if kws)
+        groups = []
+        for group_type, kws in grouped.items():
+            if not kws:
+                continue
+            group_name, share = LOCAL_GROUPS[group_type]
+            percentage = round(100.0 * share / used_share, 1)
+            groups.append(SimpleAdGroup(
+                group_name=group_name,
+                group_type=group_type,
+                keywords=kws,
+                budget_allocation=round(budget * percentage / 100.0, 2),
+                budget_percentage=percentage,
+                total_keywords=len(kws),
+                avg_cpc_range=self._cpc_range(kws)
+            ))
+
+        logger.info(f"Local grouping created {len(groups)} ad groups from {len(priority_keywords)} keywords")
+        return SimplifiedDeliverable(
+            ad_groups=groups,
+            total_budget=budget,
+            total_keywords_used=len(keywords),
+            budget_summary={group.group_type: group.budget_percentage for group in groups},
+            processing_time=time.time() - start_time,
+            generated_by=LOCAL_GROUPING
+        )
 
-        try:
+    @staticmethod
+    def _domain_token(url: str) -> str:
+        """https://www.my-brand.co.uk/ -> my brand"""
+        host = urlparse(url).hostname or ""
+        parts = [part for part in host.split(".") if part not in ("www", "")]
+        return parts[0].replace("-", " ") if parts else ""
+    
+    async def update_ad_groups(self, existing: SimplifiedDeliverable, diff: KeywordDiff,
+                               request: KeywordResearchRequest, total_keywords: int) -> GroupingUpdate:
+        """Applies a keyword diff to existing ad groups, only the top new keywords go through the LLM
 
-            logger.info(f"Starting priority selection: {len(keywords)} keywords -> top {top_n}")
+        New keywords that didn't get placed (past the top 20, or skipped by the model) come back in unplaced
+        """
+        start_time = time.time()
+        deliverable = existing.model_copy(deep=True)
+        touched = set()
+
+        dropped = {kw.keyword.lower() for kw in diff.dropped}
+        changed = {kw.keyword.lower(): kw for kw in diff.volume_changed}
+
+        # Drop removed keywords and refresh volumes in place
+        for group in deliverable.ad_groups:
+            kept = []
+            for kw in group.keywords:
+                text = kw.keyword.lower()
+                if text in dropped:
+                    touched.add(group.group_name)
+                    continue
+                if text in changed:
+                    kw.search_volume = changed[text].search_volume
+                    kw.cpc_low = changed[text].bid_low
+                    kw.cpc_high = changed[text].bid_high
+                    touched.add(group.group_name)
+                kept.append(kw)
+            group.keywords = kept
+
+        # Place only the new keywords into the existing groups
+        placement_failed = False
+        if diff.added:
+            try:
+                logger.info(f"Placing {len(diff.added)} new keywords into {len(deliverable.ad_groups)} existing groups")
+                priority_keywords = await self._create_priority_keywords(diff.added, 20)
+                prompt = self._create_placement_prompt(priority_keywords, deliverable.ad_groups)
+                placements, _ = await self.ladder.run(partial(self._call_llm, prompt), self._parse_placements)
+                touched |= self._apply_placements(placements, priority_keywords, deliverable.ad_groups)
+            except Exception as e:
+                # Keep the reused groups for this response, the caller doesn't store them so nothing is lost
+                logger.error(f"Placing new keywords failed: {str(e)}")
+                placement_failed = True
+
+        for group in deliverable.ad_groups:
+            if group.group_name in touched:
+                group.total_keywords = len(group.keywords)
+                group.avg_cpc_range = self._cpc_range(group.keywords)
+
+        grouped = {kw.keyword.lower() for group in deliverable.ad_groups for kw in group.keywords}
+        unplaced = [kw for kw in diff.added if kw.keyword.lower() not in grouped]
+
+        deliverable.total_keywords_used = total_keywords
+        deliverable.processing_time = time.time() - start_time
+        logger.info(f"Incremental update touched {len(touched)} of {len(deliverable.ad_groups)} groups "
+                    f"in {deliverable.processing_time:.1f}s, {len(unplaced)} new keywords left unplaced")
+        return GroupingUpdate(deliverable, unplaced, placement_failed)
+
+    def _create_placement_prompt(self, keywords: List[KeywordData], groups: List[SimpleAdGroup]) -> str:
+
+        keyword_sample = [{
+            "keyword": kw.keyword,
+            "search_volume": kw.search_volume,
+            "competition": kw.competition_level.value,
+            "cpc": kw.cpc,
+            "concept_groups": kw.concept_groups
+        } for kw in keywords]
+        group_sample = [{
+            "group_name": group.group_name,
+            "group_type": group.group_type,
+            "example_keywords": [kw.keyword for kw in group.keywords[:5]]
+        } for group in groups]
+
+        return f"""
+    You are an expert Google Ads strategist.
 
-            min_volume = min(kw.search_volume for kw in keywords if kw.search_volume is not None)
-            max_volume = max(kw.search_volume for kw in keywords if kw.search_volume is not None)
-            cpc_min = min(kw.cpc for kw in keywords if kw.cpc is not None)
-            cpc_max = max(kw.cpc for kw in keywords if kw.cpc is not None)
+    These ad groups already exist:
 
-            logger.info(f"Volume range: {min_volume}-{max_volume}, CPC range: {cpc_min:.2f}-{cpc_max:.2f}")
+    {json.dumps(group_sample, indent=2)}
 
-            weights = [0.4, 0.3, 0.3] # weights for search_vol, cpc, competition
+    Place each of these new keywords into the best fitting existing ad group:
 
-            final_scores = []
-            for kw in keywords:
+    {json.dumps(keyword_sample, indent=2)}
 
-                if max_volume == min_volume:
-                    norm_volume = 0.5  
-                else:
-                    norm_volume = (kw.search_volume - min_volume) / (max_volume - min_volume)
+    Use ONLY the group names above. Return ONLY JSON in the following format:
 
-                if cpc_max == cpc_min:
-                    norm_cpc = 0.5
-                else:
-                    norm_cpc = 1 - ((kw.cpc - cpc_min)/(cpc_max - cpc_min))
+    {{
+    "placements": [
+        {{
+        "keyword": "example keyword",
+        "group_name": "Brand Terms",
+        "suggested_match_types": ["exact", "phrase"]
+        }}
+    ]
+    }}
+    """
 
-                if kw.competition_level == CompetitionLevel.HIGH : norm_comp = 0
-                elif kw.competition_level == CompetitionLevel.LOW : norm_comp = 1
-                else: norm_comp = 0.5
+    @staticmethod
+    def _parse_placements(response: str) -> List[dict]:
+        placements = LLMService._extract_json(response).get("placements")
+        if not isinstance(placements, list) or not placements:
+            raise ValueError("No placements in response")
+        return placements
+
+    def _apply_placements(self, placements: List[dict], keywords: List[KeywordData], groups: List[SimpleAdGroup]) -> set:
+        """Adds placed keywords to their groups, returns names of groups that changed"""
+        groups_by_name = {group.group_name: group for group in groups}
+        keywords_by_text = {kw.keyword.lower(): kw for kw in keywords}
+        touched = set()
+
+        for placement in placements:
+            kw = keywords_by_text.pop(str(placement.get("keyword", "")).lower(), None)
+            group = groups_by_name.get(placement.get("group_name"))
+            if kw is None or group is None:
+                continue
+            group.keywords.append(SimpleKeyword(
+                keyword=kw.keyword,
+                search_volume=kw.search_volume,
+                competition_level=kw.competition_level.value,
+                cpc_low=kw.bid_low,
+                cpc_high=kw.bid_high,
+                suggested_match_types=placement.get("suggested_match_types", ["broad"])
+            ))
+            touched.add(group.group_name)
+
+        logger.info(f"Placed {len(keywords) - len(keywords_by_text)} of {len(keywords)} new keywords")
+        return touched
+
+    def _cpc_range(self, keywords: List[SimpleKeyword]) -> str:
+        if not keywords:
+            return "$0.00 - $0.00"
+        return f"${min(kw.cpc_low for kw in keywords):.2f} - ${max(kw.cpc_high for kw in keywords):.2f}"
+
+    async def _create_priority_keywords(self, keywords: List[KeywordData], top_n: int) -> List[KeywordData]:
 
-                weighted_score = weights[0]*norm_volume + weights[1]*norm_cpc + weights[2]*norm_comp
-                final_scores.append((weighted_score, kw))
+        try:
 
-            logger.info("Scoring completed, sorting by priority")
+            logger.info(f"Starting priority selection: {len(keywords)} keywords -> top {top_n}")
 
-            final_scores.sort(key=lambda x: x[0], reverse=True)
+            # Scoring runs on compact (volume, cpc, competition) tuples so it is cheap to ship to a worker
+            rows = [(kw.search_volume, kw.cpc, kw.competition_level.value) for kw in keywords]
+            final_scores = await run_cpu(LLMService._score_keywords, rows, size=len(rows))
 
-            top_keywords = [priority_scores[1] for priority_scores in final_scores[:top_n]] # return first top_n priority keywords
+            top_keywords = [keywords[index] for _, index in final_scores[:top_n]] # return first top_n priority keywords
             
             logger.info(f"Priority selection complete: selected {len(top_keywords)} keywords")
             
@@ -106,6 +350,54 @@ class LLMService:
             logger.error(f"Priority selection failed: {str(e)}")
             raise
 
+    @staticmethod
+    def _with_gap_candidates(priority_keywords: List[KeywordData], keywords: List[KeywordData],
+                             limit: int) -> List[KeywordData]:
+        """Priority keywords plus the highest volume competitor gap keywords that didn't make the cut"""
+        chosen = {kw.keyword.lower() for kw in priority_keywords}
+        gaps = [kw for kw in keywords
+                if COMPETITOR_GAP_CONCEPT in (kw.concept_groups or []) and kw.keyword.lower() not in chosen]
+        gaps.sort(key=lambda kw: kw.search_volume, reverse=True)
+        if gaps[:limit]:
+            logger.info(f"Adding {len(gaps[:limit])} competitor gap keywords as Competitor Terms candidates")
+        return priority_keywords + gaps[:limit]
+
+    @staticmethod
+    def _score_keywords(rows: List[Tuple[int, float, str]]) -> List[Tuple[float, int]]:
+        """(score, index) pairs sorted best first, rows are (search_volume, cpc, competition)"""
+        volumes = [volume for volume, _, _ in rows if volume is not None]
+        cpcs = [cpc for _, cpc, _ in rows if cpc is not None]
+        min_volume, max_volume = min(volumes), max(volumes)
+        cpc_min, cpc_max = min(cpcs), max(cpcs)
+
+        logger.info(f"Volume range: {min_volume}-{max_volume}, CPC range: {cpc_min:.2f}-{cpc_max:.2f}")
+
+        weights = [0.4, 0.3, 0.3] # weights for search_vol, cpc, competition
+
+        final_scores = []
+        for index, (volume, cpc, competition) in enumerate(rows):
+
+            if max_volume == min_volume:
+                norm_volume = 0.5  
+            else:
+                norm_volume = (volume - min_volume) / (max_volume - min_volume)
+
+            if cpc_max == cpc_min:
+                norm_cpc = 0.5
+            else:
+                norm_cpc = 1 - ((cpc - cpc_min)/(cpc_max - cpc_min))
+
+            if competition == CompetitionLevel.HIGH.value : norm_comp = 0
+            elif competition == CompetitionLevel.LOW.value : norm_comp = 1
+            else: norm_comp = 0.5
+
+            weighted_score = weights[0]*norm_volume + weights[1]*norm_cpc + weights[2]*norm_comp
+            final_scores.append((weighted_score, index))
+
+        # Stable sort on score only, ties keep upstream order like before
+        final_scores.sort(key=lambda x: x[0], reverse=True)
+        return final_scores
+
         
     
     def _create_prompt(self, keywords: List[KeywordData], budget: float) -> str:
@@ -155,6 +447,7 @@ class LLMService:
     - "Brand Names" concept → Brand Terms
     - "Product" concept → Category Terms
     - "Competitors" concept → Competitor Terms
+    - "{COMPETITOR_GAP_CONCEPT}" concept (competitor ranks for it, the brand doesn't) → Competitor Terms candidate
     - "Geography" concept → Location-based Queries
     - Long keywords (4+ words) → Long-Tail Informational
 
@@ -192,105 +485,119 @@ class LLMService:
             logger.error(f"Prompt creation failed: {str(e)}")
             raise
     
-    async def _call_llm(self, prompt: str) -> str:
+    async def _call_llm(self, prompt: str, model: str, max_tokens: int,
+                        timeout: Optional[float] = None) -> Tuple[str, Dict[str, int]]:
+        """One completion, returns (text, token usage)"""
 
         try: 
+            # The SDK client is blocking, run it in a thread so the event loop keeps serving other requests
+            client = self.client if timeout is None else self.client.with_options(timeout=timeout, max_retries=0)
+
             # Returns Raw LLM response containing JSON and possibly explanatory text
-            response = self.client.chat.completions.create(
-                model="gpt-4",
+            call = asyncio.ensure_future(asyncio.to_thread(
+                client.chat.completions.create,
+                model=model,
                 messages=[
                     {"role": "system", "content": "You are a Google Ads expert. Return only valid JSON reponses."},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.2,
-                max_tokens=5000
-            )
-            return response.choices[0].message.content
+                max_tokens=max_tokens
+            ))
+            try:
+                response = await asyncio.wait_for(asyncio.shield(call), timeout)
+            except (asyncio.TimeoutError, asyncio.CancelledError):
+                # The thread can't be stopped and a request that still finishes is billed, count its tokens then
+                call.add_done_callback(partial(self._record_late_usage, model))
+                raise
+            return response.choices[0].message.content or "", self._usage(response)
+        except asyncio.TimeoutError:
+            logger.error(f"OpenAI call ({model}) timed out after {timeout:.1f}s")
+            raise
         except Exception as e:
-            logger.error(f"OpenAI call failed: {str(e)}")
+            # The SDK raises its own timeout error when its request timeout hits first
+            if timeout is not None and "timed out" in str(e).lower():
+                logger.error(f"OpenAI call ({model}) timed out after {timeout:.1f}s")
+                raise asyncio.TimeoutError() from e
+            logger.error(f"OpenAI call ({model}) failed: {str(e)}")
             raise
     
+    @staticmethod
+    def _usage(response) -> Dict[str, int]:
+        return {
+            "prompt_tokens": getattr(response.usage, "prompt_tokens", 0) or 0,
+            "completion_tokens": getattr(response.usage, "completion_tokens", 0) or 0,
+        }
+
+    def _record_late_usage(self, model: str, call: asyncio.Future):
+        if not call.cancelled() and call.exception() is None:
+            self.model_stats.add_usage(model, self._usage(call.result()))
+
+    @staticmethod
+    def _extract_json(response: str) -> dict:
+        """First { to last } of a possibly mixed response, raises ValueError when there is no valid JSON"""
+        start = response.find('{')
+        end = response.rfind('}') + 1
+
+        # Check if JSON braces were found
+        if start == -1 or end == 0:
+            raise ValueError("No JSON found in response")
+        return json.loads(response[start:end])
+
     def _parse_json(self, response: str, budget: float, total_keywords: int) -> SimplifiedDeliverable:
-        try:
+        """LLM answer -> deliverable, raises ValueError (json errors included) when it can't be parsed"""
+        logger.info("Starting JSON parsing")
+        json_data = self._extract_json(response)
+        logger.info("JSON extracted and parsed successfully")
+
+        # Build ad groups with safe field access , basically converting back to pydantic objects
+        groups = []
+        for group_data in json_data.get("ad_groups", []):
+            keywords = []
+            for kw in group_data.get("keywords", []):
+                keywords.append(SimpleKeyword(
+                    keyword=kw.get("keyword", ""),
+                    search_volume=kw.get("search_volume", 0),
+                    competition_level=kw.get("competition_level", "medium"),
+                    cpc_low=kw.get("cpc_low", 0.0),
+                    cpc_high=kw.get("cpc_high", 0.0),
+                    suggested_match_types=kw.get("suggested_match_types", ["broad"])
+                ))
 
-            logger.info("Starting JSON parsing")
+            groups.append(SimpleAdGroup(
+                group_name=group_data.get("group_name", "Unknown Group"),
+                group_type=group_data.get("group_type", "category"),
+                keywords=keywords,
+                budget_allocation=group_data.get("budget_allocation", 0.0),
+                budget_percentage=group_data.get("budget_percentage", 0.0),
+                total_keywords=group_data.get("total_keywords", len(keywords)),
+                avg_cpc_range=group_data.get("avg_cpc_range", "$0.00 - $0.00")
+            ))
 
-            # Find JSON in potentially mixed response
-            start = response.find('{')
-            end = response.rfind('}') + 1
-            
-            # Check if JSON braces were found
-            if start == -1 or end == 0:
-                logger.error("No JSON braces found in response")
-                raise ValueError("No JSON found in response")
-                
-            json_str = response[start:end]
-            json_data = json.loads(json_str)
-            logger.info("JSON extracted and parsed successfully")
-            
-            # Build ad groups with safe field access , basically converting back to pydantic objects
-            groups = []
-            for group_data in json_data.get("ad_groups", []):
-                keywords = []
-                for kw in group_data.get("keywords", []):
-                    keywords.append(SimpleKeyword(
-                        keyword=kw.get("keyword", ""),
-                        search_volume=kw.get("search_volume", 0),
-                        competition_level=kw.get("competition_level", "medium"),
-                        cpc_low=kw.get("cpc_low", 0.0),
-                        cpc_high=kw.get("cpc_high", 0.0),
-                        suggested_match_types=kw.get("suggested_match_types", ["broad"])
-                    ))
-                
-                groups.append(SimpleAdGroup(
-                    group_name=group_data.get("group_name", "Unknown Group"),
-                    group_type=group_data.get("group_type", "category"),
-                    keywords=keywords,
-                    budget_allocation=group_data.get("budget_allocation", 0.0),
-                    budget_percentage=group_data.get("budget_percentage", 0.0),
-                    total_keywords=group_data.get("total_keywords", len(keywords)),
-                    avg_cpc_range=group_data.get("avg_cpc_range", "$0.00 - $0.00")
-                ))
+        logger.info(f"Successfully created {len(groups)} ad groups")
 
-            logger.info(f"Successfully created {len(groups)} ad groups")
-            
-            return SimplifiedDeliverable(
-                ad_groups=groups,
-                total_budget=json_data.get("total_budget", budget),
-                total_keywords_used=json_data.get("total_keywords_used", total_keywords),
-                budget_summary=json_data.get("budget_summary", {"brand": 50, "category": 35, "competitor": 15}),
-                processing_time=0.0
-            )
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"JSON parsing failed - invalid JSON: {str(e)}")
-            return self._create_fallback(budget, total_keywords)
-        except ValueError as e:
-            logger.error(f"JSON structure error: {str(e)}")
-            return self._create_fallback(budget, total_keywords)
-        except KeyError as e:
-            logger.error(f"Missing required field: {str(e)}")
-            return self._create_fallback(budget, total_keywords)
-
-    def _create_fallback(self, budget: float, total_keywords: int) -> SimplifiedDeliverable:
-
-        logger.warning("Creating fallback response")
-
-        """Simple fallback when parsing fails"""
-        fallback_group = SimpleAdGroup(
-            group_name="Parsing Failed",
-            group_type="error",
-            keywords=[],
-            budget_allocation=budget,
-            budget_percentage=100.0,
-            total_keywords=0,
-            avg_cpc_range="$0.00 - $0.00"
-        )
-        
         return SimplifiedDeliverable(
-            ad_groups=[fallback_group],
-            total_budget=budget,
-            total_keywords_used=total_keywords,
-            budget_summary={"error": 100},
+            ad_groups=groups,
+            total_budget=json_data.get("total_budget", budget),
+            total_keywords_used=json_data.get("total_keywords_used", total_keywords),
+            budget_summary=json_data.get("budget_summary", {"brand": 50, "category": 35, "competitor": 15}),
             processing_time=0.0
         )
+
+    def _validated_deliverable(self, response: str, prompt_keywords: List[KeywordData], budget: float,
+                               total_keywords: int) -> SimplifiedDeliverable:
+        """Parses the answer and rejects it (ValueError) when it lost or made up keywords, so the ladder escalates"""
+        deliverable = self._parse_json(response, budget, total_keywords)
+
+        returned = [kw.keyword.lower() for group in deliverable.ad_groups for kw in group.keywords]
+        if not returned:
+            raise ValueError("No keywords in ad groups")
+
+        expected = {kw.keyword.lower() for kw in prompt_keywords}
+        known = sum(1 for text in returned if text in expected)
+        if known < MIN_KNOWN_KEYWORD_SHARE * len(returned):
+            raise ValueError(f"Only {known} of {len(returned)} returned keywords were in the prompt")
+        placed = len(expected & set(returned))
+        if placed < MIN_PLACED_KEYWORD_SHARE * len(expected):
+            raise ValueError(f"Only {placed} of {len(expected)} keywords were placed")
+        return deliverable
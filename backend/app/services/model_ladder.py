@@ -0,0 +1,168 @@
+import asyncio
+import time
+import logging
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Tuple, TypeVar
+from app.config import LLM_MODEL_LADDER, LLM_MAX_TOKENS, LLM_RACE_AFTER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# (model, max_tokens, timeout) -> (text, {"prompt_tokens": .., "completion_tokens": ..})
+LLMCall = Callable[[str, int, Optional[float]], Awaitable[Tuple[str, Dict[str, int]]]]
+
+
+class ModelRung(NamedTuple):
+    model: str
+    max_tokens: int
+
+
+class LadderExhausted(Exception):
+    pass
+
+
+def parse_ladder(spec: str = LLM_MODEL_LADDER, default_max_tokens: int = LLM_MAX_TOKENS) -> List[ModelRung]:
+    """"gpt-4o-mini,gpt-4o:6000" -> rungs in order, max_tokens per model after the colon"""
+    rungs = []
+    for entry in spec.split(","):
+        model, _, max_tokens = entry.strip().partition(":")
+        if model:
+            rungs.append(ModelRung(model, int(max_tokens) if max_tokens else default_max_tokens))
+    return rungs
+
+
+class ModelStats:
+
+    # Per model: outcomes, latency and token usage, for tuning cost against p95. Timed out and cancelled attempts
+    # add their elapsed time (a lower bound), so the slow calls that trigger racing show up in p95
+    def __init__(self):
+        self.models: Dict[str, dict] = {}
+
+    def _model(self, model: str) -> dict:
+        if model not in self.models:
+            self.models[model] = {
+                "attempts": 0, "valid": 0, "validation_failures": 0, "errors": 0, "timeouts": 0, "cancelled": 0,
+                "prompt_tokens": 0, "completion_tokens": 0, "latencies": deque(maxlen=500),
+            }
+        return self.models[model]
+
+    def record(self, model: str, outcome: str, latency: Optional[float] = None, usage: Optional[Dict[str, int]] = None):
+        """outcome is "valid", "validation_failures", "errors", "timeouts" or "cancelled" """
+        entry = self._model(model)
+        entry["attempts"] += 1
+        entry[outcome] += 1
+        if latency is not None:
+            entry["latencies"].append(latency)
+        self.add_usage(model, usage)
+
+    def add_usage(self, model: str, usage: Optional[Dict[str, int]]):
+        """Tokens without an attempt, e.g. a cancelled call whose request still finished (and was billed)"""
+        entry = self._model(model)
+        for field in ("prompt_tokens", "completion_tokens"):
+            entry[field] += (usage or {}).get(field, 0)
+
+    def stats(self) -> dict:
+        result = {}
+        for model, entry in self.models.items():
+            latencies = sorted(entry["latencies"])
+            answered = entry["valid"] + entry["validation_failures"]
+            result[model] = {
+                **{key: value for key, value in entry.items() if key != "latencies"},
+                "validation_failure_rate": round(entry["validation_failures"] / answered, 3) if answered else 0.0,
+                "latency_p50": round(latencies[len(latencies) // 2], 3) if latencies else 0.0,
+                "latency_p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 3) if latencies else 0.0,
+            }
+        return result
+
+
+class ModelLadder:
+
+    # Fast model first, the next rung only when the answer fails validation (or errors). With race_after set,
+    # a rung still running after that many seconds gets the next rung started next to it, first valid answer wins
+    def __init__(self, rungs: List[ModelRung], stats: ModelStats, race_after: Optional[float] = LLM_RACE_AFTER_SECONDS):
+        self.rungs = rungs
+        self.stats = stats
+        self.race_after = race_after
+
+    async def run(self, call: LLMCall, validate: Callable[[str], T], timeout: Optional[float] = None,
+                  max_tokens_cap: Optional[int] = None) -> Tuple[T, str]:
+        """Returns (validated result, model). Raises TimeoutError when timeout runs out, LadderExhausted otherwise"""
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        pending = list(self.rungs)
+        running: Dict[asyncio.Task, float] = {}  # attempt -> started at
+        failures = []
+
+        def start_next():
+            rung = pending.pop(0)
+            max_tokens = min(rung.max_tokens, max_tokens_cap) if max_tokens_cap else rung.max_tokens
+            remaining = expires_at - time.monotonic() if expires_at is not None else None
+            running[asyncio.create_task(self._attempt(rung.model, max_tokens, remaining, call, validate))] = time.monotonic()
+
+        start_next()
+        try:
+            while running:
+                wait = None
+                if self.race_after and pending and len(running) == 1:
+                    wait = max(0.0, next(iter(running.values())) + self.race_after - time.monotonic())
+                if expires_at is not None:
+                    left = max(0.0, expires_at - time.monotonic())
+                    wait = left if wait is None else min(wait, left)
+
+                done, _ = await asyncio.wait(running, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if expires_at is not None and time.monotonic() >= expires_at:
+                        raise asyncio.TimeoutError()
+                    logger.info(f"No answer after {self.race_after:.1f}s, racing {pending[0].model}")
+                    start_next()
+                    continue
+
+                for task in done:
+                    running.pop(task)
+                    ok, value, model = task.result()
+                    if ok:
+                        return value, model
+                    failures.append(f"{model}: {value}")
+
+                if not running and pending:
+                    logger.info(f"Escalating to {pending[0].model} after: {failures[-1]}")
+                    start_next()
+        finally:
+            # Losing attempts keep running in their thread, their answer is ignored (the LLMCall may count its tokens)
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+
+        if expires_at is not None and time.monotonic() >= expires_at:
+            raise asyncio.TimeoutError()
+        raise LadderExhausted("; ".join(failures))
+
+    async def _attempt(self, model: str, max_tokens: int, timeout: Optional[float], call: LLMCall,
+                       validate: Callable[[str], T]) -> tuple:
+        """(ok, validated result or error message, model), never raises except on cancellation"""
+        start = time.monotonic()
+        try:
+            text, usage = await call(model, max_tokens, timeout)
+        except asyncio.CancelledError:
+            # Lost a race or ran into the deadline
+            self.stats.record(model, "cancelled", time.monotonic() - start)
+            raise
+        except asyncio.TimeoutError:
+            self.stats.record(model, "timeouts", time.monotonic() - start)
+            return False, "timed out", model
+        except Exception as e:
+            self.stats.record(model, "errors")
+            return False, f"call failed: {str(e)}", model
+
+        latency = time.monotonic() - start
+        try:
+            result = validate(text)
+        except Exception as e:
+            self.stats.record(model, "validation_failures", latency, usage)
+            logger.warning(f"{model} answer failed validation: {str(e)}")
+            return False, f"invalid answer: {str(e)}", model
+
+        self.stats.record(model, "valid", latency, usage)
+        logger.info(f"{model} answered in {latency:.1f}s ({usage.get('completion_tokens', 0)} completion tokens)")
+        return True, result, model
@@ -0,0 +1,224 @@
+import heapq
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+# Concept group added to keywords the competitor site has and the brand site doesn't,
+# ad-group generation treats them as Competitor Terms candidates
+COMPETITOR_GAP_CONCEPT = "Competitor Gap"
+
+# Rows handed to the worker: (lowercased keyword, search volume)
+OverlapRow = Tuple[str, int]
+
+# 2^14 registers: ~0.8% standard error on cardinalities, 16 KB per domain
+HLL_PRECISION = 14
+
+# Bottom-k MinHash size: Jaccard standard error ~ sqrt(J(1-J)/k), about 0.7% absolute at k=1024 for J=0.05,
+# which is still ~15% relative on the small overlaps typical between sites
+MINHASH_SIZE = 1024
+
+# Estimate mode ranks candidates from this many top-volume gap keywords per competitor, per requested candidate
+CANDIDATE_POOL_FACTOR = 4
+
+# Sketches live for one compute_overlap call, so the built-in (per-process salted) string hash is stable enough
+HASH_MASK = (1 << 64) - 1
+
+
+class HyperLogLog:
+
+    # Cardinality sketch, mergeable by taking the register-wise max
+    def __init__(self, precision: int = HLL_PRECISION, registers: bytearray = None):
+        self.precision = precision
+        self.size = 1 << precision
+        self.registers = registers if registers is not None else bytearray(self.size)
+
+    def add_hash(self, value: int):
+        index = value >> (64 - self.precision)
+        rest = value & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        return HyperLogLog(self.precision, bytearray(map(max, self.registers, other.registers)))
+
+    def count(self) -> int:
+        m = self.size
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        # Small range correction: linear counting is more accurate while many registers are still empty
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return int(round(estimate))
+
+
+class MinHash:
+
+    # Bottom-k MinHash: the k smallest hashes of the set, one hash per element
+    def __init__(self, values: List[int], size: int = MINHASH_SIZE):
+        self.values = values
+        self.size = size
+
+    def jaccard(self, other: "MinHash") -> float:
+        mine, theirs = set(self.values), set(other.values)
+        union_bottom = heapq.nsmallest(self.size, mine | theirs)
+        if not union_bottom:
+            return 0.0
+        return sum(1 for value in union_bottom if value in mine and value in theirs) / len(union_bottom)
+
+
+def _sketch(texts: Iterable[str]) -> Tuple[HyperLogLog, MinHash]:
+    """One pass, no per-domain hash set: memory is the HLL registers plus the MINHASH_SIZE smallest hashes"""
+    hll = HyperLogLog()
+    registers, low_bits = hll.registers, 64 - hll.precision
+    low_mask = (1 << low_bits) - 1
+    smallest: List[int] = []  # Max-heap (negated) of the smallest hashes so far
+    members: Set[int] = set()  # Same hashes, so duplicate keywords don't take two slots
+    for text in texts:
+        value = hash(text) & HASH_MASK
+        index = value >> low_bits
+        rank = low_bits - (value & low_mask).bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+        if len(smallest) < MINHASH_SIZE:
+            if value not in members:
+                heapq.heappush(smallest, -value)
+                members.add(value)
+        elif value < -smallest[0] and value not in members:
+            members.discard(-heapq.heapreplace(smallest, -value))
+            members.add(value)
+    return hll, MinHash(sorted(members))
+
+
+def compute_overlap(domains: List[List[OverlapRow]], exact: bool, max_candidates: int) -> dict:
+    """
+    domains[0] is the brand, the rest are competitors. Runs in the executor.
+    Returns counts per competitor (shared / gap / brand only / unique / jaccard), pairwise competitor Jaccard
+    and gap candidates as (keyword, competitors that have it, best volume, domain index of that volume),
+    ranked by how many competitors have them, then volume
+    """
+    brand = {text for text, _ in domains[0]}
+    competitor_rows = domains[1:]
+
+    if exact:
+        competitors = [{text for text, _ in rows} for rows in competitor_rows]
+        gap_counts = Counter()
+        for keywords in competitors:
+            gap_counts.update(keywords - brand)
+        stats = _exact_stats(brand, competitors, gap_counts)
+        stats["candidates"] = _rank_candidates(competitor_rows, gap_counts, max_candidates)
+        return stats
+
+    # Estimates never build competitor sets or cross-domain counts, candidates come from each competitor's
+    # highest volume gap keywords
+    stats = _estimated_stats(brand, competitor_rows)
+    pools = [
+        heapq.nlargest(max_candidates * CANDIDATE_POOL_FACTOR, (row for row in rows if row[0] not in brand),
+                       key=lambda row: row[1])
+        for rows in competitor_rows
+    ]
+    gap_counts = Counter()
+    for pool in pools:
+        gap_counts.update({text for text, _ in pool})
+    stats["candidates"] = _rank_candidates(pools, gap_counts, max_candidates)
+    return stats
+
+
+def _rank_candidates(competitor_rows: List[List[OverlapRow]], gap_counts: Counter, max_candidates: int) -> List[tuple]:
+    if not gap_counts or max_candidates <= 0:
+        return []
+
+    # Only keywords at or above the count level of the max_candidates-th one can make the cut, look up their volumes
+    cutoff = sorted(gap_counts.values(), reverse=True)[min(max_candidates, len(gap_counts)) - 1]
+    contenders = {text: count for text, count in gap_counts.items() if count >= cutoff}
+
+    best: Dict[str, Tuple[int, int]] = {}  # text -> (volume, domain index)
+    for domain_index, rows in enumerate(competitor_rows, start=1):
+        for text, volume in rows:
+            if text in contenders and volume > best.get(text, (-1, 0))[0]:
+                best[text] = (volume, domain_index)
+
+    ranked = heapq.nlargest(max_candidates, contenders.items(), key=lambda item: (item[1], best[item[0]][0]))
+    return [(text, count, best[text][0], best[text][1]) for text, count in ranked]
+
+
+def _exact_stats(brand: Set[str], competitors: List[Set[str]], gap_counts: Counter) -> dict:
+    only_one = {text for text, count in gap_counts.items() if count == 1}
+
+    per_competitor = []
+    for keywords in competitors:
+        shared = len(brand & keywords)
+        union = len(brand | keywords)
+        per_competitor.append({
+            "total_keywords": len(keywords),
+            "shared_with_brand": shared,
+            "gap_keywords": len(keywords) - shared,
+            "brand_only_keywords": len(brand) - shared,
+            "unique_keywords": len(keywords & only_one),
+            "jaccard": shared / union if union else 0.0,
+        })
+
+    similarity = [
+        (i, j, len(competitors[i] & competitors[j]) / max(1, len(competitors[i] | competitors[j])))
+        for i in range(len(competitors)) for j in range(i + 1, len(competitors))
+    ]
+    return {
+        "brand_keywords": len(brand),
+        "competitors": per_competitor,
+        "total_gap_keywords": len(gap_counts),
+        "similarity": similarity,
+    }
+
+
+def _estimated_stats(brand: Set[str], competitor_rows: List[List[OverlapRow]]) -> dict:
+    brand_hll, brand_minhash = _sketch(brand)
+    sketches = [_sketch(text for text, _ in rows) for rows in competitor_rows]
+    brand_count = len(brand)
+
+    # Union of everyone and of everyone but competitor i (brand + prefix + suffix merges, linear in competitors)
+    # for the keywords only competitor i has
+    prefixes = [brand_hll]
+    for hll, _ in sketches:
+        prefixes.append(prefixes[-1].merge(hll))
+    suffixes = [None] * len(sketches)
+    running = None
+    for i in range(len(sketches) - 1, -1, -1):
+        suffixes[i] = running
+        running = sketches[i][0] if running is None else running.merge(sketches[i][0])
+    everyone_count = prefixes[-1].count()
+
+    per_competitor = []
+    for i, (hll, minhash) in enumerate(sketches):
+        count = hll.count()
+        jaccard = brand_minhash.jaccard(minhash)
+        # |B n C| = J * |B u C|
+        shared = min(count, brand_count, int(round(jaccard * brand_hll.merge(hll).count())))
+
+        others = prefixes[i] if suffixes[i] is None else prefixes[i].merge(suffixes[i])
+        unique = min(count, max(0, everyone_count - others.count()))
+
+        per_competitor.append({
+            "total_keywords": count,
+            "shared_with_brand": shared,
+            "gap_keywords": max(0, count - shared),
+            "brand_only_keywords": max(0, brand_count - shared),
+            "unique_keywords": unique,
+            "jaccard": jaccard,
+        })
+
+    similarity = [
+        (i, j, sketches[i][1].jaccard(sketches[j][1]))
+        for i in range(len(sketches)) for j in range(i + 1, len(sketches))
+    ]
+    return {
+        "brand_keywords": brand_count,
+        "competitors": per_competitor,
+        "total_gap_keywords": max(0, everyone_count - brand_hll.count()),
+        "similarity": similarity,
+    }
+
+
+def overlap_rows(keywords: Sequence) -> List[OverlapRow]:
+    """KeywordData list -> compact rows, cheap to send to a worker process"""
+    return [(kw.keyword.strip().lower(), kw.search_volume) for kw in keywords]
@@ -0,0 +1,110 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import logging
+from pathlib import Path
+from typing import Optional, Tuple
+from app.models.requests import KeywordResearchRequest
+from app.models.ad_groups import FinalKeywordResponse
+from app.config import RESULT_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class ResultStore:
+
+    # Completed research results stored as one JSON file per request hash
+    def __init__(self, store_dir: str = RESULT_STORE_DIR):
+        self.store_dir = Path(store_dir)
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def normalize_request(request: KeywordResearchRequest) -> dict:
+        """Same research inputs -> same dict, regardless of casing, slashes or seed/location order"""
+        data = request.model_dump(mode="json")
+        for field in ("brand_website", "competitor_website"):
+            data[field] = str(data[field]).strip().lower().rstrip("/")
+        data.pop("deadline_seconds", None)  # How long we wait doesn't change the result
+        data.pop("api_mode", None)  # Neither does live vs queued fetching
+        for field in ("location", "locations", "language_name", "languages"):
+            data.pop(field, None)
+        data["locations"] = sorted({loc.lower() for loc in request.get_locations()})
+        data["languages"] = sorted({lang.lower() for lang in request.get_languages()})
+        seeds = data.get("seed_keywords") or []
+        data["seed_keywords"] = sorted({kw.strip().lower() for kw in seeds if kw.strip()})
+        return data
+
+    @classmethod
+    def research_id(cls, request: KeywordResearchRequest) -> str:
+        normalized = json.dumps(cls.normalize_request(request), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+    @staticmethod
+    def etag_for(response: FinalKeywordResponse) -> str:
+        body = response.model_dump_json().encode("utf-8")
+        return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    def _path(self, research_id: str) -> Path:
+        return self.store_dir / f"{research_id}.json"
+
+    def get(self, research_id: str, max_age: Optional[float] = None) -> Optional[Tuple[FinalKeywordResponse, str]]:
+        """Returns (response, etag) or None if missing, unreadable or older than max_age seconds"""
+        if not research_id.isalnum():
+            return None
+
+        path = self._path(research_id)
+        if not path.exists():
+            return None
+
+        try:
+            with open(path, "r") as file:
+                record = json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Stored result {research_id} unreadable: {str(e)}")
+            return None
+
+        if max_age is not None and time.time() - record.get("stored_at", 0) > max_age:
+            return None
+
+        response = FinalKeywordResponse(**record["response"])
+        return response, record["etag"]
+
+    def age(self, research_id: str) -> Optional[float]:
+        """Seconds since the stored result was written, None if there is none"""
+        written = self.written_at(research_id)
+        return time.time() - written if written is not None else None
+
+    def written_at(self, research_id: str) -> Optional[float]:
+        """File mtime of the stored result (no JSON read), None if there is none"""
+        if not research_id.isalnum():
+            return None
+        path = self._path(research_id)
+        return path.stat().st_mtime if path.exists() else None
+
+    def put(self, research_id: str, request: KeywordResearchRequest, response: FinalKeywordResponse) -> str:
+        """Stores a completed response and returns its etag"""
+        etag = self.etag_for(response)
+        record = {
+            "research_id": research_id,
+            "stored_at": time.time(),
+            "etag": etag,
+            "request": self.normalize_request(request),
+            "response": response.model_dump(mode="json"),
+        }
+
+        # Write to temp file then rename so readers never see a half written file,
+        # the temp name is unique so concurrent writers of the same research don't share it
+        path = self._path(research_id)
+        fd, tmp_path = tempfile.mkstemp(dir=self.store_dir, prefix=f"{research_id}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                json.dump(record, file)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        logger.info(f"Stored research result {research_id}")
+        return etag
@@ -0,0 +1,15 @@
+from functools import lru_cache
+from app.services.base_keyword_service import BaseKeywordService
+from app.services.llm_service import LLMService
+
+# Services hold no per-request state, so one instance is shared by all requests
+
+
+@lru_cache(maxsize=None)
+def get_base_keyword_service() -> BaseKeywordService:
+    return BaseKeywordService()
+
+
+@lru_cache(maxsize=None)
+def get_llm_service() -> LLMService:
+    return LLMService()
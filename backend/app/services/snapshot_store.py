@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import tempfile
+import time
+import logging
+from pathlib import Path
+from typing import Callable, IO, Iterator, List, Optional, Tuple
+from app.models.keyword import KeywordData
+from app.models.ad_groups import SimplifiedDeliverable
+from app.config import SNAPSHOT_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+
+class SnapshotStore:
+
+    # Keyword snapshots per source (site / seeds) and the last ad grouping per research
+    def __init__(self, store_dir: str = SNAPSHOT_STORE_DIR):
+        self.store_dir = Path(store_dir)
+        (self.store_dir / "sources").mkdir(parents=True, exist_ok=True)
+        (self.store_dir / "groupings").mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def source_key(source: str, target: str, location: str, language: str, min_search_volume: int) -> str:
+        raw = (f"{source}|{target.strip().lower().rstrip('/')}|{location.strip().lower()}|"
+               f"{language.strip().lower()}|{min_search_volume}")
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+    def _read(self, path: Path) -> Optional[dict]:
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r") as file:
+                return json.load(file)
+        except (OSError, json.JSONDecodeError) as e:
+            logger.error(f"Snapshot {path.name} unreadable: {str(e)}")
+            return None
+
+    @staticmethod
+    def _replace(path: Path, write: Callable[[IO[str]], None]):
+        # Write to temp file then rename so readers never see a half written file,
+        # the temp name is unique so concurrent writers of the same key don't share it
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, prefix=f"{path.name}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as file:
+                write(file)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def _write(self, path: Path, record: dict):
+        self._replace(path, lambda file: json.dump(record, file))
+
+    def get_source(self, key: str) -> Optional[Tuple[List[KeywordData], float]]:
+        """Returns (keywords, age in seconds) for a source snapshot"""
+        record = self._read(self.store_dir / "sources" / f"{key}.json")
+        if not record:
+            return None
+        keywords = [KeywordData(**kw) for kw in record["keywords"]]
+        return keywords, time.time() - record.get("fetched_at", 0)
+
+    def put_source(self, key: str, keywords: List[KeywordData]):
+        self._write(self.store_dir / "sources" / f"{key}.json", {
+            "fetched_at": time.time(),
+            "keywords": [kw.model_dump(mode="json") for kw in keywords],
+        })
+
+    def get_grouping(self, research_id: str) -> Optional[Tuple[List[KeywordData], SimplifiedDeliverable]]:
+        """Returns the merged keyword set and ad groups from the last run of this research"""
+        deliverable = self.get_grouping_deliverable(research_id)
+        if deliverable is None:
+            return None
+        return list(self.iter_grouping_keywords(research_id)), deliverable
+
+    def get_grouping_deliverable(self, research_id: str) -> Optional[SimplifiedDeliverable]:
+        record = self._read(self.store_dir / "groupings" / f"{research_id}.json")
+        if not record:
+            return None
+        return SimplifiedDeliverable(**record["deliverable"])
+
+    def iter_grouping_keywords(self, research_id: str) -> Iterator[KeywordData]:
+        """Keyword set of a grouping read one line at a time, so exports never hold the whole list"""
+        path = self.store_dir / "groupings" / f"{research_id}.keywords.jsonl"
+        if not path.exists():
+            # Groupings stored before the keywords moved to their own file
+            record = self._read(self.store_dir / "groupings" / f"{research_id}.json")
+            for kw in (record or {}).get("keywords", []):
+                yield KeywordData(**kw)
+            return
+
+        with open(path, "r") as file:
+            for line in file:
+                if line.strip():
+                    yield KeywordData.model_validate_json(line)
+
+    def put_grouping(self, research_id: str, keywords: List[KeywordData], deliverable: SimplifiedDeliverable):
+        # Keywords first, so a reader that sees the new deliverable also sees its keywords
+        def write_keywords(file: IO[str]):
+            for kw in keywords:
+                file.write(kw.model_dump_json())
+                file.write("\n")
+        self._replace(self.store_dir / "groupings" / f"{research_id}.keywords.jsonl", write_keywords)
+
+        self._write(self.store_dir / "groupings" / f"{research_id}.json", {
+            "stored_at": time.time(),
+            "deliverable": deliverable.model_dump(mode="json"),
+        })
@@ -0,0 +1,217 @@
+import asyncio
+import time
+import uuid
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional
+from app.services.http_client import get_http_client
+from app.config import (
+    STANDARD_POLL_MIN_SECONDS, STANDARD_POLL_MAX_SECONDS, STANDARD_MAX_IN_FLIGHT,
+    STANDARD_TASK_TIMEOUT, STANDARD_GET_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+API_ROOT = "https://api.dataforseo.com"
+
+# DataForSEO accepts up to 100 tasks per task_post call
+POST_BATCH_SIZE = 100
+
+# How long new submissions are collected before posting, so concurrent requests share one task_post call
+POST_LINGER_SECONDS = 0.1
+
+TASK_CREATED = 20100
+
+
+class PendingTask:
+
+    def __init__(self, endpoint: str, headers: dict, future: asyncio.Future):
+        self.endpoint = endpoint
+        self.headers = headers
+        self.future = future
+        self.submitted_at = time.monotonic()
+
+
+class TaskScheduler:
+
+    # Runs DataForSEO standard (queued) tasks: task_post in batches, then tasks_ready / task_get polling
+    # with an interval that backs off while nothing is ready and resets as soon as results come in
+    def __init__(self, min_interval: float = STANDARD_POLL_MIN_SECONDS, max_interval: float = STANDARD_POLL_MAX_SECONDS,
+                 max_in_flight: int = STANDARD_MAX_IN_FLIGHT, task_timeout: float = STANDARD_TASK_TIMEOUT):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.task_timeout = task_timeout
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._outbox: List[tuple] = []  # (endpoint, headers, task payload, future)
+        self._pending: Dict[str, PendingTask] = {}  # DataForSEO task id -> waiting request
+        self._wake = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._interval = min_interval
+        self._next_poll = 0.0
+        self._counters = {"posted": 0, "completed": 0, "failed": 0, "expired": 0, "polls": 0, "empty_polls": 0}
+
+    async def run(self, endpoint: str, task: dict, headers: dict) -> bytes:
+        """Posts one task to `endpoint` (without /task_post) and returns the raw task_get response body"""
+        async with self._slots:
+            future = asyncio.get_running_loop().create_future()
+            self._outbox.append((endpoint, headers, dict(task, tag=uuid.uuid4().hex), future))
+            self._ensure_running()
+            self._wake.set()
+            return await future
+
+    def _ensure_running(self):
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                if self._outbox:
+                    await asyncio.sleep(POST_LINGER_SECONDS)
+                    await self._post_outbox()
+
+                now = time.monotonic()
+                if self._pending and now >= self._next_poll:
+                    collected = await self._collect_ready()
+                    self._counters["polls"] += 1
+                    if collected:
+                        self._interval = self.min_interval
+                    else:
+                        self._counters["empty_polls"] += 1
+                        self._interval = min(self._interval * 2, self.max_interval)
+                    self._next_poll = time.monotonic() + self._interval
+
+                self._expire()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # One bad poll shouldn't strand every waiting request, try again next interval
+                logger.error(f"Standard task scheduler error: {str(e)}")
+                self._next_poll = time.monotonic() + self._interval
+
+            self._wake.clear()
+            if self._outbox:
+                continue
+            timeout = max(0.0, self._next_poll - time.monotonic()) if self._pending else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _post_outbox(self):
+        outbox, self._outbox = self._outbox, []
+        by_endpoint: Dict[tuple, List[tuple]] = {}
+        for endpoint, headers, task, future in outbox:
+            if not future.done():  # Skip requests that gave up (deadline) before we posted
+                by_endpoint.setdefault((endpoint, headers["Authorization"]), []).append((headers, task, future))
+
+        for (endpoint, _), entries in by_endpoint.items():
+            for start in range(0, len(entries), POST_BATCH_SIZE):
+                await self._post_batch(endpoint, entries[start:start + POST_BATCH_SIZE])
+
+    async def _post_batch(self, endpoint: str, entries: List[tuple]):
+        headers = entries[0][0]
+        try:
+            response = await get_http_client().post(f"{endpoint}/task_post", headers=headers,
+                                                    json=[task for _, task, _ in entries])
+            if response.status_code != 200:
+                raise Exception(f"API error: {response.status_code} - {response.text}")
+            created = response.json().get("tasks") or []
+        except Exception as e:
+            for _, _, future in entries:
+                self._fail(future, Exception(f"task_post failed: {str(e)}"))
+            return
+
+        by_tag = {(task.get("data") or {}).get("tag"): task for task in created}
+        for _, task, future in entries:
+            result = by_tag.get(task["tag"])
+            if result is None or result.get("status_code") != TASK_CREATED:
+                message = result.get("status_message") if result else "missing from task_post response"
+                self._fail(future, Exception(f"task_post rejected task: {message}"))
+                continue
+            self._pending[result["id"]] = PendingTask(endpoint, headers, future)
+            self._counters["posted"] += 1
+
+        # New tasks rarely finish within seconds, but poll soon so short queues come back quickly
+        self._interval = self.min_interval
+        self._next_poll = time.monotonic() + self.min_interval
+        logger.info(f"Posted {len(entries)} standard tasks to {endpoint}, {len(self._pending)} pending")
+
+    async def _collect_ready(self) -> int:
+        """Fetches every pending task that tasks_ready reports, returns how many were collected"""
+        endpoints = {}
+        for pending in self._pending.values():
+            endpoints.setdefault((pending.endpoint, pending.headers["Authorization"]), pending.headers)
+
+        ready_urls = {}
+        for (endpoint, _), headers in endpoints.items():
+            response = await get_http_client().get(f"{endpoint}/tasks_ready", headers=headers)
+            if response.status_code != 200:
+                raise Exception(f"tasks_ready error: {response.status_code} - {response.text}")
+            for task in response.json().get("tasks") or []:
+                for ready in task.get("result") or []:
+                    task_id = ready.get("id")
+                    if task_id in self._pending:
+                        path = ready.get("endpoint")
+                        ready_urls[task_id] = f"{API_ROOT}{path}" if path else f"{endpoint}/task_get/{task_id}"
+
+        semaphore = asyncio.Semaphore(STANDARD_GET_CONCURRENCY)
+
+        async def fetch(task_id: str, url: str):
+            async with semaphore:
+                pending = self._pending.get(task_id)
+                if pending is None:
+                    return
+                try:
+                    response = await get_http_client().get(url, headers=pending.headers)
+                    if response.status_code != 200:
+                        raise Exception(f"task_get error: {response.status_code} - {response.text}")
+                except Exception as e:
+                    # Leave it pending, tasks_ready keeps listing it until it's collected
+                    logger.error(f"Collecting standard task {task_id} failed: {str(e)}")
+                    return
+                self._pending.pop(task_id, None)
+                if not pending.future.done():
+                    pending.future.set_result(response.content)
+                self._counters["completed"] += 1
+
+        await asyncio.gather(*[fetch(task_id, url) for task_id, url in ready_urls.items()])
+        return len(ready_urls)
+
+    def _expire(self):
+        now = time.monotonic()
+        for task_id, pending in list(self._pending.items()):
+            if pending.future.done():
+                # Waiter was cancelled, the result is no longer wanted
+                self._pending.pop(task_id)
+            elif now - pending.submitted_at > self.task_timeout:
+                self._pending.pop(task_id)
+                self._counters["expired"] += 1
+                self._fail(pending.future, asyncio.TimeoutError(f"standard task {task_id} not ready after {self.task_timeout}s"))
+
+    def _fail(self, future: asyncio.Future, error: Exception):
+        self._counters["failed"] += 1
+        if not future.done():
+            future.set_exception(error)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "queued_for_post": len(self._outbox),
+            "poll_interval": self._interval,
+            **self._counters,
+        }
+
+    async def close(self):
+        if self._runner is not None:
+            self._runner.cancel()
+            await asyncio.gather(self._runner, return_exceptions=True)
+            self._runner = None
+        for pending in self._pending.values():
+            pending.future.cancel()
+        self._pending.clear()
+
+
+@lru_cache(maxsize=None)
+def get_task_scheduler() -> TaskScheduler:
+    return TaskScheduler()
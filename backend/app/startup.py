@@ -0,0 +1,72 @@
+import asyncio
+import time
+import logging
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
+from app.config import PREWARM_CONNECTIONS
+
+logger = logging.getLogger(__name__)
+
+# Read by the /ready endpoint, timings are in seconds
+startup_state = {"ready": False, "timings": {}, "errors": []}
+
+DATAFORSEO_URL = "https://api.dataforseo.com/"
+
+
+async def _timed(name: str, step):
+    start = time.perf_counter()
+    try:
+        await step()
+    except Exception as e:
+        # A failed warm-up only costs the first request its connection setup, don't block readiness on it
+        logger.error(f"Startup step {name} failed: {str(e)}")
+        startup_state["errors"].append(f"{name}: {str(e)}")
+    startup_state["timings"][name] = round(time.perf_counter() - start, 3)
+
+
+async def warm_up():
+    """Builds the service singletons and optionally opens upstream connections ahead of the first request"""
+    from app.services.singletons import get_base_keyword_service, get_llm_service
+    from app.services.http_client import get_http_client
+
+    start = time.perf_counter()
+
+    async def build_services():
+        get_base_keyword_service()
+        # Importing openai is the slowest part of startup, do it off the event loop
+        await asyncio.to_thread(lambda: get_llm_service().client)
+
+    await _timed("services", build_services)
+
+    if PREWARM_CONNECTIONS:
+        async def prewarm_dataforseo():
+            # Any response means DNS + TLS are done and the connection sits in the pool
+            await get_http_client().head(DATAFORSEO_URL)
+
+        await asyncio.gather(
+            _timed("prewarm_dataforseo", prewarm_dataforseo),
+            _timed("prewarm_openai", get_llm_service().warm_up),
+        )
+
+    startup_state["timings"]["total"] = round(time.perf_counter() - start, 3)
+    startup_state["ready"] = True
+    logger.info(f"Startup warm-up finished: {startup_state['timings']}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up runs in the background so /health answers while connections are being opened
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+
+    from app.services.http_client import close_http_client
+    from app.services.executor import shutdown_executor
+    from app.services.task_scheduler import get_task_scheduler
+    from app.api.v1.endpoints.keywords import cache_warmer
+    await cache_warmer.close()
+    if get_task_scheduler.cache_info().currsize:
+        await get_task_scheduler().close()
+        get_task_scheduler.cache_clear()
+    await close_http_client()
+    shutdown_executor()
@@ -0,0 +1,98 @@
+"""
+Event-loop lag under N concurrent large researches, per executor mode.
+
+Runs the CPU-bound stages of the pipeline (response parsing, dedup/merge, priority scoring) on fake
+DataForSEO responses while a probe task measures how late the event loop wakes it up.
+
+Run from backend/:  python benchmarks/bench_event_loop_lag.py [concurrent] [rows_per_source]
+"""
+import asyncio
+import json
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+# Running as a script puts benchmarks/ on sys.path, app lives one level up in backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.requests import KeywordResearchRequest
+from app.services.base_keyword_service import BaseKeywordService
+from app.services.executor import configure_executor
+from app.services.keyword_parsing import parse_keywords_off_loop
+from app.services.llm_service import LLMService
+
+PROBE_INTERVAL = 0.005
+
+
+def fake_response(rows: int, seed: int) -> bytes:
+    rng = random.Random(seed)
+    result = [{
+        "keyword": f"keyword {rng.randint(0, rows * 2)} term {i % 50}",
+        "search_volume": rng.randint(10, 100000),
+        "competition": rng.choice(["LOW", "MEDIUM", "HIGH"]),
+        "low_top_of_page_bid": rng.random() * 2,
+        "high_top_of_page_bid": rng.random() * 5,
+        "cpc": rng.random() * 4,
+        "keyword_annotations": {"concepts": [{"concept_group": {"name": "Product"}}]}
+    } for i in range(rows)]
+    return json.dumps({"tasks": [{"result": result}]}).encode("utf-8")
+
+
+async def research(responses, request, base_service, llm_service):
+    source_results = []
+    for content in responses:
+        source_results.append(await parse_keywords_off_loop(content, 0))
+    sources = [source._replace(fetch=None) for source in base_service._build_sources(request)]
+    keywords = await base_service._combine(sources, source_results)
+    await llm_service._create_priority_keywords(keywords, 20)
+
+
+async def probe(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(time.perf_counter() - start - PROBE_INTERVAL)
+
+
+async def run(mode: str, concurrent: int, responses, request):
+    configure_executor(mode=mode)
+    base_service, llm_service = BaseKeywordService(), LLMService()
+
+    # Warm the pool so worker start-up is not counted
+    await research(responses[:1], request, base_service, llm_service)
+
+    lags, stop = [], asyncio.Event()
+    probe_task = asyncio.create_task(probe(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*[research(responses, request, base_service, llm_service) for _ in range(concurrent)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await probe_task
+    configure_executor(mode="inline")
+
+    lags.sort()
+    p99 = lags[int(len(lags) * 0.99) - 1] if lags else 0.0
+    print(f"{mode:>8}: wall {elapsed:.2f}s | loop lag max {max(lags, default=0) * 1000:.1f}ms "
+          f"p99 {p99 * 1000:.1f}ms median {statistics.median(lags or [0]) * 1000:.2f}ms")
+
+
+def main():
+    concurrent = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 5000
+
+    request = KeywordResearchRequest(
+        brand_website="https://brand.example", competitor_website="https://competitor.example",
+        seed_keywords=["seed"], location="United States", shopping_ads_budget=0,
+        search_ads_budget=1000, pmax_ads_budget=0, min_search_volume=0
+    )
+    responses = [fake_response(rows, seed) for seed in range(3)]
+    print(f"{concurrent} concurrent researches, 3 sources x {rows} rows each")
+
+    for mode in ("inline", "thread", "process"):
+        asyncio.run(run(mode, concurrent, responses, request))
+
+
+if __name__ == "__main__":
+    main()
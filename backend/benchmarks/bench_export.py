@@ -0,0 +1,81 @@
+"""
+Ads Editor export throughput on synthetic keywords.
+
+Run from backend/:  python benchmarks/bench_export.py [keywords]
+Prints rows/s and MB/s per format, and the peak memory the streaming writer allocates on top of the input.
+"""
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Running as a script puts benchmarks/ on sys.path, app lives one level up in backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.keyword import KeywordData, CompetitionLevel
+from app.models.ad_groups import SimplifiedDeliverable, SimpleAdGroup, SimpleKeyword
+from app.services.ads_editor_export import stream_rows, keyword_rows, ad_group_rows
+
+WORDS = ["protein", "yeast", "vegan", "powder", "gut", "healthy", "low", "fat", "buy", "best", "cheap", "online"]
+
+
+def synthetic_keywords(count: int):
+    rng = random.Random(7)
+    return [
+        KeywordData.model_construct(
+            keyword=" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) + f" {i}",
+            search_volume=rng.randint(10, 100000), competition_level=CompetitionLevel.MEDIUM,
+            bid_low=round(rng.uniform(0.1, 2), 2), bid_high=round(rng.uniform(2, 8), 2), cpc=1.0,
+            concept_groups=[rng.choice(["Product", "Brand", "Health"])], locale_metrics=[]
+        )
+        for i in range(count)
+    ]
+
+
+def synthetic_deliverable(keywords, groups: int = 50, per_group: int = 40) -> SimplifiedDeliverable:
+    ad_groups = []
+    for g in range(groups):
+        chunk = keywords[g * per_group:(g + 1) * per_group]
+        ad_groups.append(SimpleAdGroup(
+            group_name=f"Group {g}", group_type="category",
+            keywords=[SimpleKeyword(keyword=kw.keyword, search_volume=kw.search_volume, competition_level="medium",
+                                    cpc_low=kw.bid_low, cpc_high=kw.bid_high, suggested_match_types=["phrase", "broad"])
+                      for kw in chunk],
+            budget_allocation=100, budget_percentage=2, total_keywords=len(chunk), avg_cpc_range="$1.00 - $2.00"
+        ))
+    return SimplifiedDeliverable(ad_groups=ad_groups, total_budget=5000, total_keywords_used=groups * per_group,
+                                 budget_summary={}, processing_time=0)
+
+
+def drain(chunks) -> int:
+    # Stands in for the socket: count bytes and drop each chunk
+    return sum(len(chunk.encode("utf-8")) for chunk in chunks)
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500_000
+    keywords = synthetic_keywords(total)
+    deliverable = synthetic_deliverable(keywords)
+
+    for file_format in ("csv", "tsv"):
+        start = time.perf_counter()
+        size = drain(stream_rows(keyword_rows(keywords, deliverable, "Bench", "broad"), file_format))
+        elapsed = time.perf_counter() - start
+        print(f"keywords {file_format}: {total} rows in {elapsed:.2f}s, "
+              f"{total / elapsed:,.0f} rows/s, {size / elapsed / 1e6:.1f} MB/s, output {size / 1e6:.1f} MB")
+
+    start = time.perf_counter()
+    rows = sum(1 for _ in ad_group_rows(deliverable, "Bench"))
+    size = drain(stream_rows(ad_group_rows(deliverable, "Bench")))
+    print(f"ad_groups csv: {rows} rows in {(time.perf_counter() - start) * 1000:.1f}ms, output {size / 1e3:.0f} KB")
+
+    tracemalloc.start()
+    drain(stream_rows(keyword_rows(keywords, deliverable, "Bench", "broad"), "csv"))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"peak memory while streaming {total} rows: {peak / 1e6:.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
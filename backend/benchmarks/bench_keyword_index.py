@@ -0,0 +1,70 @@
+"""
+Keyword index build and lookup benchmark on synthetic keywords.
+
+Run from backend/:  python benchmarks/bench_keyword_index.py [keywords] [lookups]
+The index is written to a temporary file and removed afterwards.
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Running as a script puts benchmarks/ on sys.path, app lives one level up in backend/
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.models.keyword import KeywordData, CompetitionLevel
+from app.services.keyword_index import KeywordIndex
+
+RARE_WORDS = [f"w{i}" for i in range(20000)]
+COMMON_WORDS = ["protein", "shoes", "running", "yeast", "vegan", "cheap", "best", "near", "me"]
+BATCH = 10000
+
+
+def synthetic_keywords(rng: random.Random, count: int):
+    for _ in range(count):
+        # One word in five is a common one, so common-token lookups hit large posting lists
+        text = " ".join(rng.choice(COMMON_WORDS if rng.random() < 0.2 else RARE_WORDS) for _ in range(rng.randint(1, 5)))
+        yield KeywordData.model_construct(
+            keyword=text, search_volume=rng.randint(10, 100000), competition_level=CompetitionLevel.MEDIUM,
+            bid_low=0.5, bid_high=2.0, cpc=1.0, concept_groups=["Product"], locale_metrics=[]
+        )
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    lookups = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = KeywordIndex(os.path.join(tmp, "index.sqlite3"))
+
+        start = time.perf_counter()
+        batch = []
+        for kw in synthetic_keywords(rng, total):
+            batch.append(kw)
+            if len(batch) == BATCH:
+                index.add(batch, "United States", "English")
+                batch = []
+        if batch:
+            index.add(batch, "United States", "English")
+        print(f"built {index.stats()} in {time.perf_counter() - start:.1f}s")
+
+        for label, seeds in (("rare token", lambda: [rng.choice(RARE_WORDS)]),
+                             ("rare+common", lambda: [f"{rng.choice(COMMON_WORDS)} {rng.choice(RARE_WORDS)}"]),
+                             ("common token", lambda: [rng.choice(COMMON_WORDS)])):
+            times, found = [], []
+            for _ in range(lookups):
+                start = time.perf_counter()
+                result = index.lookup(seeds(), "United States", "English", limit=100)
+                times.append(time.perf_counter() - start)
+                found.append(len(result[0]))
+            times.sort()
+            print(f"{label:>12}: p50 {statistics.median(times) * 1000:.2f}ms p99 {times[int(len(times) * 0.99) - 1] * 1000:.2f}ms "
+                  f"(avg {statistics.mean(found):.0f} results)")
+
+
+if __name__ == "__main__":
+    main()
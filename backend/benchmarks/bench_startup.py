@@ -0,0 +1,55 @@
+"""
+Startup-time benchmark: cold import of the app and lifespan warm-up in fresh processes.
+
+Run from backend/:  python benchmarks/bench_startup.py [runs]
+Set PREWARM_CONNECTIONS=true to include the upstream DNS/TLS pre-warm (needs network).
+"""
+import json
+import statistics
+import subprocess
+import sys
+
+IMPORT_SNIPPET = """
+import sys, time
+start = time.perf_counter()
+import app.main
+print(round(time.perf_counter() - start, 4), 'openai' in sys.modules)
+"""
+
+WARMUP_SNIPPET = """
+import asyncio, json, time
+from app.main import app
+from app.startup import startup_state, warm_up
+
+async def main():
+    start = time.perf_counter()
+    await warm_up()
+    print(json.dumps({"warm_up": round(time.perf_counter() - start, 4), **startup_state["timings"]}))
+
+asyncio.run(main())
+"""
+
+
+def run(snippet: str) -> str:
+    result = subprocess.run([sys.executable, "-c", snippet], capture_output=True, text=True, check=True)
+    return result.stdout.strip().splitlines()[-1]
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    import_times = []
+    for _ in range(runs):
+        elapsed, openai_loaded = run(IMPORT_SNIPPET).split()
+        import_times.append(float(elapsed))
+    print(f"import app.main: median {statistics.median(import_times):.3f}s "
+          f"(min {min(import_times):.3f}s, max {max(import_times):.3f}s), openai imported eagerly: {openai_loaded}")
+
+    warm_ups = [json.loads(run(WARMUP_SNIPPET)) for _ in range(runs)]
+    for step in warm_ups[0]:
+        values = [w[step] for w in warm_ups if step in w]
+        print(f"warm-up {step}: median {statistics.median(values):.3f}s")
+
+
+if __name__ == "__main__":
+    main()